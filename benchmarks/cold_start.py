@@ -0,0 +1,109 @@
+"""
+Cold-start benchmark: how long a fresh worker takes to serve its first request.
+
+Each run is a new Python process that imports the app, runs its start-up
+hooks and serves GET /health/db in-process through ASGI. Runs are repeated
+for each start-up configuration and medians reported:
+
+    always      SCHEMA_SYNC=always: create_all on every boot
+    auto        SCHEMA_SYNC=auto: skip create_all when the stored schema version matches
+    lazy        SCHEMA_SYNC=auto with LAZY_STARTUP=1: start-up work runs on the first request
+
+    python benchmarks/cold_start.py --runs 10
+    python benchmarks/cold_start.py --database-url postgresql://... --output cold_start.json
+
+The database is created by one warm-up run before measuring, so "auto"
+and "lazy" measure the version-matches path a restarting worker takes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    "always": {"SCHEMA_SYNC": "always", "LAZY_STARTUP": "0"},
+    "auto": {"SCHEMA_SYNC": "auto", "LAZY_STARTUP": "0"},
+    "lazy": {"SCHEMA_SYNC": "auto", "LAZY_STARTUP": "1"},
+}
+METRICS = ("import_ms", "startup_ms", "first_request_ms", "ready_ms", "process_ms")
+
+
+async def child_main(started: float):
+    # Runs inside the measured process; the benchmark's own client is
+    # imported first so it is not counted as app import time
+    sys.path.insert(0, ROOT)
+    from httpx import AsyncClient, ASGITransport
+    import_started = time.perf_counter()
+    from main import app
+    imported = time.perf_counter()
+
+    async with app.router.lifespan_context(app):
+        started_up = time.perf_counter()
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            response = await client.get("/health/db")
+        answered = time.perf_counter()
+    response.raise_for_status()
+    print(json.dumps({
+        "import_ms": (imported - import_started) * 1000,
+        "startup_ms": (started_up - imported) * 1000,
+        "first_request_ms": (answered - started_up) * 1000,
+        "ready_ms": (answered - started) * 1000,
+    }))
+
+
+def run_child(env: dict) -> dict:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        env=env, cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main(args):
+    base_env = dict(os.environ, DATABASE_URL=args.database_url, SECRET_KEY=os.getenv("SECRET_KEY", "benchmark-secret"))
+    if args.database_url.startswith("sqlite") and os.path.exists(args.sqlite_path):
+        os.remove(args.sqlite_path)
+    results = {}
+    for name in args.modes:
+        env = dict(base_env, **MODES[name])
+        run_child(env)  # warm-up: creates the schema and fills the OS file cache
+        runs = [run_child(env) for _ in range(args.runs)]
+        results[name] = {metric: round(statistics.median(r[metric] for r in runs), 2) for metric in METRICS}
+
+    print(f"{'mode':<8}" + "".join(f"{metric:>18}" for metric in METRICS))
+    for name, medians in results.items():
+        print(f"{name:<8}" + "".join(f"{medians[metric]:>16.1f}ms" for metric in METRICS))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": args.runs, "results": results}, f, indent=2)
+    if args.database_url.startswith("sqlite") and os.path.exists(args.sqlite_path):
+        os.remove(args.sqlite_path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs per mode")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./cold_start.db")
+    parser.add_argument("--output", help="Write medians as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.sqlite_path = os.path.join(ROOT, args.database_url.rsplit("///", 1)[-1])
+    return args
+
+
+if __name__ == "__main__":
+    process_started = time.perf_counter()
+    arguments = parse_args()
+    if arguments.child:
+        asyncio.run(child_main(process_started))
+    else:
+        main(arguments)
@@ -0,0 +1,311 @@
+"""
+Load/benchmark suite for the TaskFlow API.
+
+Seeds users, tasks and subtasks straight into the database, then drives
+the API in-process through ASGI (default) or against a running server
+(--base-url) and reports p50/p95/p99 latency, throughput and SQL queries
+per request for each scenario:
+
+    login       concurrent POST /auth/login (bcrypt)
+    list        walk GET /tasks/ pages with keyset cursors
+    subtasks    toggle subtasks with PUT /tasks/{id}/subtasks/{id}
+    bulk        PATCH /tasks/bulk with 100 items
+    summary     POST /ai/summary against the local Gemini stub
+
+    python benchmarks/run.py --tasks-per-user 10000
+    python benchmarks/run.py --compare benchmarks/baseline.json
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+
+With --compare the run exits non-zero when a scenario's p95 regresses by
+more than --latency-tolerance, its queries per request go up, or any
+request fails. Remote runs seed through DATABASE_URL, which must point at
+the server's database, and the server should use GEMINI_API_BASE_URL to
+reach scripts/gemini_stub.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = ("login", "list", "subtasks", "bulk", "summary")
+PASSWORD = "benchmark-password"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def configure_environment(args):
+    # Must run before the app is imported; settings are read at import time
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench.db")
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    # Every request comes from one client; measure the endpoints, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    # Measure the full summary path rather than cache hits
+    os.environ.setdefault("SUMMARY_CACHE_BACKEND", "none")
+
+
+async def seed(args):
+    """
+    Create users with tasks and subtasks directly in the database.
+
+    Returns:
+        Dict of email -> {"tasks": [task ids], "subtasks": [(task id, subtask id)]}
+    """
+    from sqlalchemy import insert
+    from database import engine, Base
+    from services.password_service import pwd_context
+    import services.task_search  # registers the search index DDL with create_all/drop_all
+    import models
+
+    rng = random.Random(args.seed)
+    hashed_password = pwd_context.hash(PASSWORD)
+    now = datetime.now(timezone.utc)
+    users = {}
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    for u in range(args.users):
+        email = f"bench{u}@example.com"
+        user_id = str(uuid.uuid4())
+        owned = {"tasks": [], "subtasks": []}
+        async with engine.begin() as conn:
+            await conn.execute(insert(models.User), [
+                {"id": user_id, "email": email, "full_name": f"Bench {u}", "hashed_password": hashed_password}
+            ])
+            for start in range(0, args.tasks_per_user, 5000):
+                task_rows, subtask_rows = [], []
+                for i in range(start, min(start + 5000, args.tasks_per_user)):
+                    task_id = str(uuid.uuid4())
+                    task_rows.append({
+                        "id": task_id,
+                        "title": f"Task {i}",
+                        "description": f"Seeded task {i} for {email}",
+                        "category": rng.choice(["Work", "Home", "Errands", "Health"]),
+                        "priority": rng.choice(["low", "medium", "high"]),
+                        "status": rng.choice(["pending", "in_progress", "completed"]),
+                        "deadline": now + timedelta(days=rng.randint(-30, 60)) if rng.random() < 0.8 else None,
+                        "created_at": now - timedelta(seconds=args.tasks_per_user - i),
+                        "owner_id": user_id,
+                        "subtask_total": 0,
+                        "subtask_completed": 0,
+                    })
+                    owned["tasks"].append(task_id)
+                    for s in range(args.subtasks_per_task):
+                        subtask_id = str(uuid.uuid4())
+                        is_completed = rng.random() < 0.5
+                        subtask_rows.append({
+                            "id": subtask_id,
+                            "title": f"Step {s}",
+                            "is_completed": is_completed,
+                            "task_id": task_id,
+                        })
+                        owned["subtasks"].append((task_id, subtask_id))
+                        task_rows[-1]["subtask_total"] += 1
+                        task_rows[-1]["subtask_completed"] += is_completed
+                await conn.execute(insert(models.Task), task_rows)
+                if subtask_rows:
+                    await conn.execute(insert(models.Subtask), subtask_rows)
+        users[email] = owned
+    return users
+
+
+async def statement_total(client):
+    response = await client.get("/metrics")
+    for line in response.text.splitlines():
+        if line.startswith("db_statements_total "):
+            return float(line.split()[-1])
+    return 0.0
+
+
+async def run_scenario(client, make_request, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = {}
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                failures[response.status_code] = failures.get(response.status_code, 0) + 1
+
+    statements_before = await statement_total(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    statements = await statement_total(client) - statements_before
+
+    return {
+        "requests": requests,
+        "errors": sum(failures.values()),
+        "error_statuses": failures,
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(statements / requests, 3),
+    }
+
+
+def build_scenarios(client, users: dict, tokens: dict, args):
+    emails = list(users)
+    rng = random.Random(args.seed)
+    cursors = {}
+
+    def headers_for(i):
+        email = emails[i % len(emails)]
+        return email, {"Authorization": f"Bearer {tokens[email]}"}
+
+    async def login(i):
+        email = emails[i % len(emails)]
+        return await client.post("/auth/login", data={"username": email, "password": PASSWORD})
+
+    async def list_tasks(i):
+        email, headers = headers_for(i)
+        url = f"/tasks/?limit={args.page_size}"
+        if cursors.get(email):
+            url += f"&cursor={cursors[email]}"
+        response = await client.get(url, headers=headers)
+        cursors[email] = response.headers.get("X-Next-Cursor")
+        return response
+
+    async def toggle_subtask(i):
+        email, headers = headers_for(i)
+        task_id, subtask_id = rng.choice(users[email]["subtasks"])
+        return await client.put(f"/tasks/{task_id}/subtasks/{subtask_id}",
+                                json={"is_completed": rng.random() < 0.5}, headers=headers)
+
+    async def bulk_update(i):
+        email, headers = headers_for(i)
+        task_ids = rng.sample(users[email]["tasks"], min(100, len(users[email]["tasks"])))
+        items = [{"id": task_id, "status": rng.choice(["pending", "completed"])} for task_id in task_ids]
+        return await client.patch("/tasks/bulk", json=items, headers=headers)
+
+    async def summary(i):
+        _, headers = headers_for(i)
+        return await client.post("/ai/summary", headers=headers)
+
+    return {
+        "login": login,
+        "list": list_tasks,
+        "subtasks": toggle_subtask if args.subtasks_per_task else None,
+        "bulk": bulk_update,
+        "summary": summary,
+    }
+
+
+def compare(results: dict, baseline: dict, latency_tolerance: float):
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["errors"]:
+            regressions.append(f"{name}: {current['errors']} failed requests {current['error_statuses']}")
+        if current["p95_ms"] > base["p95_ms"] * (1 + latency_tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms "
+                               f"(+{latency_tolerance:.0%} allowed)")
+        if current["queries_per_request"] > base["queries_per_request"] + 0.01:
+            regressions.append(f"{name}: {current['queries_per_request']} queries/request > "
+                               f"baseline {base['queries_per_request']}")
+    return regressions
+
+
+async def main(args):
+    from httpx import AsyncClient, ASGITransport
+
+    users = await seed(args) if args.seed_data else {}
+    if args.base_url:
+        client = AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        from main import app
+        from routers import ai
+        from scripts.gemini_stub import create_app
+        from services.gemini_client import GeminiClient
+        ai.gemini_client = GeminiClient(
+            api_key="benchmark",
+            transport=ASGITransport(app=create_app(latency_ms=args.gemini_latency_ms)),
+        )
+        client = AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    results = {}
+    async with client:
+        tokens = {}
+        for email in users:
+            response = await client.post("/auth/login", data={"username": email, "password": PASSWORD})
+            tokens[email] = response.json()["access_token"]
+
+        scenarios = build_scenarios(client, users, tokens, args)
+        print(f"{'scenario':<10}{'req':>6}{'err':>5}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'q/req':>8}")
+        for name in args.scenarios:
+            make_request = scenarios.get(name)
+            if make_request is None or not users:
+                continue
+            result = await run_scenario(client, make_request, args.requests, args.concurrency)
+            results[name] = result
+            print(f"{name:<10}{result['requests']:>6}{result['errors']:>5}{result['throughput_rps']:>9}"
+                  f"{result['p50_ms']:>8}ms{result['p95_ms']:>8}ms{result['p99_ms']:>8}ms"
+                  f"{result['queries_per_request']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.latency_tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--tasks-per-user", type=int, default=1000)
+    parser.add_argument("--subtasks-per-task", type=int, default=2)
+    parser.add_argument("--no-seed", dest="seed_data", action="store_false",
+                        help="Reuse the existing database (no scenarios run without seeded users)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--gemini-latency-ms", type=float, default=200)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed for data and request mix")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--save-baseline", help="Write results as the new baseline")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5,
+                        help="Allowed p95 increase over baseline (0.5 = +50%%)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    sys.exit(asyncio.run(main(arguments)))
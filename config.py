@@ -0,0 +1,17 @@
+"""
+Loads .env into the environment exactly once.
+
+Import this before reading settings with os.getenv; modules read their
+settings at import time.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
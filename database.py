@@ -1,36 +1,213 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from contextlib import asynccontextmanager
 import os
-from dotenv import load_dotenv
+import time
+import uuid
+from config import env_bool
+from services.metrics import instrument_engine
 
-load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if DATABASE_URL:
+def normalize_database_url(url):
+    if not url:
+        return url
     # Ensure we use the correct async driver
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
-    elif DATABASE_URL.startswith("postgresql://"):
-        DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
-    elif DATABASE_URL.startswith("postgresql+psycopg://"):
-        DATABASE_URL = DATABASE_URL.replace("postgresql+psycopg://", "postgresql+asyncpg://", 1)
-    
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql+asyncpg://", 1)
+    elif url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    elif url.startswith("postgresql+psycopg://"):
+        url = url.replace("postgresql+psycopg://", "postgresql+asyncpg://", 1)
+
     # Fix SSL parameter for asyncpg (it prefers ssl=require over sslmode=require)
-    if "sslmode=require" in DATABASE_URL:
-        DATABASE_URL = DATABASE_URL.replace("sslmode=require", "ssl=require")
-    
+    if "sslmode=require" in url:
+        url = url.replace("sslmode=require", "ssl=require")
+
     # Remove channel_binding if present (not supported by asyncpg in this context)
-    if "channel_binding=require" in DATABASE_URL:
-        DATABASE_URL = DATABASE_URL.replace("&channel_binding=require", "").replace("?channel_binding=require", "")
+    if "channel_binding=require" in url:
+        url = url.replace("&channel_binding=require", "").replace("?channel_binding=require", "")
+    return url
+
+
+DATABASE_URL = normalize_database_url(os.getenv("DATABASE_URL"))
+# Optional read replica for read-only routes; writes always go to DATABASE_URL
+DATABASE_REPLICA_URL = normalize_database_url(os.getenv("DATABASE_REPLICA_URL"))
+# After a write, that user's reads stay on the primary for this long
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+DB_ECHO = env_bool("DB_ECHO", False)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+# Transaction-pooling proxies (pgbouncer and compatibles) cannot keep
+# prepared statements across transactions, and already pool connections.
+DB_PGBOUNCER = env_bool("DB_PGBOUNCER", False)
+
+
+class PoolWaitStats:
+    """Time spent waiting to obtain a connection from the pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.failed = 0
+
+    def record(self, seconds: float):
+        self.checkouts += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def as_dict(self):
+        return {
+            "checkouts": self.checkouts,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            pool_wait_stats.failed += 1
+            raise
+        finally:
+            pool_wait_stats.record(time.perf_counter() - started)
+
+
+def engine_options(url: str) -> dict:
+    """Build create_async_engine keyword arguments from the environment."""
+    options = {"echo": DB_ECHO}
+    if not url or not url.startswith("postgresql"):
+        return options
+
+    options["pool_pre_ping"] = DB_POOL_PRE_PING
+    if DB_PGBOUNCER:
+        options["poolclass"] = NullPool
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # Unique names so statements never collide across server connections
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    else:
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+        )
+    return options
+
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine, class_=AsyncSession
 )
 
+replica_engine = None
+ReplicaSessionLocal = None
+if DATABASE_REPLICA_URL:
+    replica_engine = create_async_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL))
+    instrument_engine(replica_engine)
+    ReplicaSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=replica_engine, class_=AsyncSession
+    )
+
 Base = declarative_base()
 
+
+class PrimaryPins:
+    """
+    Users who wrote recently and must read from the primary.
+
+    A replica may lag behind the primary, so for `seconds` after a write a
+    user's reads skip it and see their own changes. Pins are per worker
+    process: with several workers, set `seconds` above the replica's
+    typical lag, or route a user's requests to one worker.
+    """
+
+    def __init__(self, seconds: float = READ_YOUR_WRITES_SECONDS, max_entries: int = 100_000):
+        self.seconds = seconds
+        self.max_entries = max_entries
+        self._until = {}  # user_id -> time.monotonic() deadline
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def record_write(self, user_id: str):
+        now = time.monotonic()
+        if len(self._until) >= self.max_entries:
+            self._until = {uid: until for uid, until in self._until.items() if until > now}
+        self._until[user_id] = now + self.seconds
+
+    def is_pinned(self, user_id: str) -> bool:
+        until = self._until.get(user_id)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._until[user_id]
+            return False
+        return True
+
+    def stats(self):
+        return {"pinned_users": len(self._until), "replica_reads": self.replica_reads, "primary_reads": self.primary_reads}
+
+
+primary_pins = PrimaryPins()
+
+
+def pool_status(db_engine=None) -> dict:
+    """Live connection pool counters for an engine."""
+    pool = (db_engine or engine).pool
+    status = {"pool_class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            status[name.replace("checked", "checked_")] = counter()
+    status["wait"] = pool_wait_stats.as_dict()
+    return status
+
+
 async def get_db():
     async with SessionLocal() as session:
         yield session
+
+
+def get_sessionmaker():
+    # For work that outlives the request's dependencies, such as a streamed
+    # response body: it opens, and closes, its own session
+    return SessionLocal
+
+
+@asynccontextmanager
+async def read_session(user_id: str, primary: AsyncSession):
+    """
+    Session for a user's read-only work.
+
+    Uses the replica when one is configured and the user has not written
+    within READ_YOUR_WRITES_SECONDS; otherwise yields `primary` as is.
+    """
+    if ReplicaSessionLocal is None or primary_pins.is_pinned(user_id):
+        primary_pins.primary_reads += 1
+        yield primary
+        return
+    primary_pins.replica_reads += 1
+    async with ReplicaSessionLocal() as session:
+        yield session
@@ -1,7 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, tasks, ai, subtasks
-from database import engine, Base
+from fastapi.responses import JSONResponse, PlainTextResponse
+from routers import auth, tasks, ai, subtasks, health, events
+from database import engine
+from services.password_service import PasswordHasherBusy, password_hasher
+from services.gemini_client import gemini_client
+from services.job_queue import summary_jobs
+from services.metrics import MetricsMiddleware, registry
+from services.auth_cache import principal_cache
+from services.summary_cache import summary_cache
+from services.change_feed import change_feed
+from services.rate_limit import RateLimitMiddleware, rate_limiter
+from services.startup import LAZY_STARTUP, LazyStartupMiddleware, StartupGate, sync_schema
+import database
 import sys
 import asyncio
 
@@ -11,26 +22,122 @@ if sys.platform == "win32":
 
 app = FastAPI(title="TaskFlow API", version="0.1.0")
 
+# Innermost, so rejections still get CORS headers and show up in metrics
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], # Allow all origins for production (or specify your vercel app url)
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(MetricsMiddleware)
+
+
+async def start_services():
+    await sync_schema(engine)
+    # gemini_client is left to start on the first AI call: building its
+    # TLS context dominates start-up time otherwise
+    await summary_jobs.start()
+    await change_feed.start()
+
+
+startup_gate = StartupGate(start_services)
+if LAZY_STARTUP:
+    # Outermost, so the first request waits for start-up before anything else runs
+    app.add_middleware(LazyStartupMiddleware, gate=startup_gate)
 
 
 @app.on_event("startup")
 async def startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if not LAZY_STARTUP:
+        await startup_gate.run()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    password_hasher.shutdown()
+    await summary_jobs.stop()
+    await gemini_client.close()
+    await change_feed.stop()
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication service is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
 
 app.include_router(auth.router)
 app.include_router(tasks.router)
 app.include_router(ai.router)
 app.include_router(subtasks.router)
+app.include_router(health.router)
+app.include_router(events.router)
 
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to TaskFlow API"}
+
+
+GEMINI_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def collect_app_stats():
+    pool = database.pool_status()
+    yield "db_pool_checked_out", "Connections currently checked out.", "gauge", pool.get("checked_out", 0)
+    yield "db_pool_overflow", "Connections open beyond the pool size.", "gauge", pool.get("overflow", 0)
+    yield "db_pool_wait_max_seconds", "Longest pool checkout wait.", "gauge", pool["wait"]["max_wait_ms"] / 1000
+    reads = database.primary_pins.stats()
+    yield "db_replica_reads_total", "Read-only requests served by the replica.", "counter", reads["replica_reads"]
+    yield ("db_primary_reads_total", "Read-only requests served by the primary (no replica, or pinned).", "counter",
+           reads["primary_reads"])
+    yield "db_pinned_users", "Users pinned to the primary after a recent write.", "gauge", reads["pinned_users"]
+    limits = rate_limiter.stats()
+    yield "rate_limit_admitted_total", "Rate-limited route requests admitted.", "counter", limits["admitted"]
+    yield "rate_limit_rejected_total", "Requests rejected with 429 by token buckets.", "counter", limits["rate_limited"]
+    yield ("rate_limit_concurrency_rejected_total", "Requests rejected with 503 by route group concurrency caps.",
+           "counter", limits["concurrency_limited"])
+    auth = principal_cache.stats()
+    yield "auth_cache_hits_total", "Principal cache hits.", "counter", auth["hits"]
+    yield "auth_cache_misses_total", "Principal cache misses.", "counter", auth["misses"]
+    summary = summary_cache.stats()
+    yield "summary_cache_hits_total", "Summary cache hits.", "counter", summary["hits"]
+    yield "summary_cache_misses_total", "Summary cache misses.", "counter", summary["misses"]
+    yield ("summary_cache_saved_seconds_total", "Upstream latency avoided by summary cache hits.", "counter",
+           summary["saved_upstream_seconds"])
+    flights = ai.summary_flight.stats()
+    yield ("summary_coalesced_total", "Summary requests that joined an identical one in flight.", "counter",
+           flights["coalesced"])
+    gemini = gemini_client.stats()
+    yield ("gemini_breaker_state", "Gemini circuit breaker state (0 closed, 1 half-open, 2 open).", "gauge",
+           GEMINI_BREAKER_STATES[gemini["breaker_state"]])
+    yield "gemini_in_flight", "Gemini calls in progress.", "gauge", gemini["in_flight"]
+    yield "gemini_calls_total", "Gemini calls made.", "counter", gemini["calls"]
+    yield "gemini_failures_total", "Gemini calls that failed after retries.", "counter", gemini["failures"]
+    yield ("gemini_short_circuited_total", "Gemini calls refused by the open breaker.", "counter",
+           gemini["short_circuited"])
+    jobs = summary_jobs.stats()
+    yield "summary_jobs_queued", "Summary jobs waiting for a worker.", "gauge", jobs["queued"]
+    yield "summary_jobs_submitted_total", "Summary jobs created.", "counter", jobs["submitted"]
+    yield ("summary_jobs_deduplicated_total", "Submits answered with the user's job in progress.", "counter",
+           jobs["deduplicated"])
+    yield "summary_jobs_completed_total", "Summary jobs that succeeded.", "counter", jobs["completed"]
+    yield "summary_jobs_failed_total", "Summary jobs that failed.", "counter", jobs["failed"]
+    feed = change_feed.stats()
+    yield "change_feed_connections", "Open change feed streams.", "gauge", feed["connections"]
+    yield "change_feed_events_published_total", "Change events published.", "counter", feed["published"]
+    yield "change_feed_overflows_total", "Events dropped because a client fell behind.", "counter", feed["overflowed"]
+    yield "change_feed_rejected_total", "Streams refused by connection limits.", "counter", feed["rejected"]
+
+
+registry.add_collector(collect_app_stats)
+
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
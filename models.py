@@ -1,10 +1,15 @@
-from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, Index, Integer
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
+from datetime import datetime, timezone
 import uuid
 
 
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -13,6 +18,8 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     full_name = Column(String, nullable=True)
     hashed_password = Column(String)
+    # Bumped by every task/subtask write; drives ETags on task reads
+    task_revision = Column(Integer, default=0, server_default="0", nullable=False)
 
     tasks = relationship("Task", back_populates="owner")
 
@@ -29,12 +36,30 @@ class Task(Base):
     status = Column(String, default="pending",
                     index=True)  # pending, in_progress, completed
     deadline = Column(DateTime(timezone=True), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set client-side as well so keyset cursors compare at full precision
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    # Touched by every task write and every write to its subtasks; drives delta sync
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, server_default=func.now())
     owner_id = Column(String, ForeignKey("users.id"))
+    # Denormalized from subtasks; maintained by the subtask write handlers
+    subtask_total = Column(Integer, default=0, server_default="0", nullable=False)
+    subtask_completed = Column(Integer, default=0, server_default="0", nullable=False)
 
     owner = relationship("User", back_populates="tasks")
     subtasks = relationship("Subtask", back_populates="task", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Serves the keyset-paginated task list: owner filter + (created_at, id) order
+        Index("ix_tasks_owner_created_id", "owner_id", "created_at", "id"),
+        # Each common list filter is a single range scan on one of these
+        Index("ix_tasks_owner_status_deadline", "owner_id", "status", "deadline"),
+        Index("ix_tasks_owner_priority_deadline", "owner_id", "priority", "deadline"),
+        Index("ix_tasks_owner_category_deadline", "owner_id", "category", "deadline"),
+        Index("ix_tasks_owner_deadline", "owner_id", "deadline"),
+        # Serves GET /tasks/changes: owner filter + (updated_at, id) keyset
+        Index("ix_tasks_owner_updated_id", "owner_id", "updated_at", "id"),
+    )
+
 
 class Subtask(Base):
     __tablename__ = "subtasks"
@@ -44,5 +69,33 @@ class Subtask(Base):
     title = Column(String, index=True)
     is_completed = Column(Boolean, default=False)
     task_id = Column(String, ForeignKey("tasks.id"))
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, server_default=func.now())
 
     task = relationship("Task", back_populates="subtasks")
+
+    __table_args__ = (
+        # Subtask lookups by task, and the per-task total/completed counts
+        Index("ix_subtasks_task_completed", "task_id", "is_completed"),
+    )
+
+
+class TaskTombstone(Base):
+    """Records a deleted task so delta sync can report the deletion."""
+    __tablename__ = "task_tombstones"
+
+    task_id = Column(String, primary_key=True)
+    owner_id = Column(String, ForeignKey("users.id"), nullable=False)
+    deleted_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_tombstones_owner_deleted", "owner_id", "deleted_at"),
+    )
+
+
+class SchemaVersion(Base):
+    """Fingerprint of the schema last created by services.startup.sync_schema."""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(String, nullable=False)
+    applied_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
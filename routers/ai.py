@@ -1,75 +1,122 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
 from services import crud_service as crud
 import schemas
 import database
 import models
-from routers.tasks import get_current_user
-import os
-import httpx
+from routers.tasks import get_current_user, get_read_db
+from services.summary_cache import summary_cache
+from services.gemini_client import gemini_client, CircuitOpenError
+from services.singleflight import SingleFlight
+from services.job_queue import summary_jobs, JobConflict, JobQueueFull
 import json
+import logging
+import time
+
+logger = logging.getLogger("taskflow.ai")
 
 router = APIRouter(
     prefix="/ai",
     tags=["ai"],
 )
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+# Number of pending tasks included in the prompt
+SUMMARY_TASK_LIMIT = 20
 
+FALLBACK_INSIGHTS = [{
+    "type": "info",
+    "title": "AI Unavailable",
+    "description": "Could not generate personalized insights at this time."
+}]
+FALLBACK_ACTIONS = ["Focus on high priority tasks", "Check your deadlines"]
 
-@router.post("/summary", response_model=schemas.AISummaryResponse)
-async def generate_summary(current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(database.get_db)):
-    tasks = await crud.get_tasks(db, user_id=current_user.id)
+# Model output is checked against the response schema before it is cached
+INSIGHTS_ADAPTER = TypeAdapter(List[schemas.AIInsight])
+ACTIONS_ADAPTER = TypeAdapter(List[str])
 
-    if not GEMINI_API_KEY:
-        raise HTTPException(
-            status_code=500, detail="Gemini API Key not configured")
+summary_flight = SingleFlight()
 
-    # 1. Calculate Deterministic Stats
-    total = len(tasks)
-    completed = len([t for t in tasks if t.status == "completed"])
-    pending = len([t for t in tasks if t.status != "completed"])
+
+async def generate_insights(prompt: str, cache_key: str):
+    """
+    Produce insights and action items for a prompt.
     
-    # Calculate overdue (naive check, assuming deadline is naive or UTC)
-    # In a real app, handle timezones carefully.
-    from datetime import datetime, timezone
-    now = datetime.now(timezone.utc)
-    overdue_tasks = [
-        t for t in tasks 
-        if t.deadline and t.deadline < now and t.status != "completed"
-    ]
-    overdue = len(overdue_tasks)
+    Served from the summary cache when possible; falls back to generic
+    advice when Gemini fails, its circuit breaker is open or its reply
+    does not match the response schema. Only valid replies are cached.
     
-    high_priority_tasks = [
-        t for t in tasks 
-        if t.priority == "high" and t.status != "completed"
-    ]
-    high_priority = len(high_priority_tasks)
+    Args:
+        prompt: Fully rendered prompt
+        cache_key: Fingerprint of the prompt
+        
+    Returns:
+        Tuple of (insights, actionItems)
+    """
+    cached = await summary_cache.get(cache_key)
+    if cached is not None:
+        return cached["insights"], cached["actionItems"]
+
+    try:
+        started = time.perf_counter()
+        text_response = await gemini_client.generate(prompt)
+        
+        # Clean up potential markdown code blocks
+        text_response = text_response.replace("```json", "").replace("```", "").strip()
+        
+        parsed_ai = json.loads(text_response)
+        if not isinstance(parsed_ai, dict):
+            raise ValueError("Expected a JSON object")
+        ai_insights = [insight.model_dump() for insight in
+                       INSIGHTS_ADAPTER.validate_python(parsed_ai.get("insights", []))]
+        ai_actions = ACTIONS_ADAPTER.validate_python(parsed_ai.get("actionItems", []))
+        await summary_cache.set(
+            cache_key,
+            {"insights": ai_insights, "actionItems": ai_actions},
+            latency=time.perf_counter() - started,
+        )
+        return ai_insights, ai_actions
+
+    except CircuitOpenError:
+        # Upstream is known to be failing; answer immediately
+        return FALLBACK_INSIGHTS, FALLBACK_ACTIONS
+    except Exception as e:
+        # Fallback if AI fails or answers with something unusable
+        logger.warning("AI generation failed: %s", e)
+        return FALLBACK_INSIGHTS, FALLBACK_ACTIONS
+
+
+async def prepare_summary(current_user: models.User, db: AsyncSession):
+    """
+    Load everything a summary needs from the database and render the prompt.
     
-    completion_rate = int((completed / total * 100) if total > 0 else 0)
-
-    stats = schemas.AIStats(
-        total=total,
-        completed=completed,
-        pending=pending,
-        overdue=overdue,
-        highPriority=high_priority,
-        completionRate=completion_rate
-    )
+    Args:
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Tuple of (stats, top tasks as schemas, prompt)
+    """
+    # 1. Calculate Deterministic Stats (aggregated in SQL over all tasks)
+    stats = await crud.get_task_stats(db, user_id=current_user.id)
+    completion_rate = stats.completionRate
+    overdue = stats.overdue
+    high_priority = stats.highPriority
 
     # 2. Prepare Data for AI
-    # We only send relevant info to save tokens and reduce noise
+    # Only the most urgent pending tasks are loaded; they are already sorted
+    # by deadline (nulls last) then priority, which is also the topTasks order.
+    pending_tasks = await crud.get_pending_tasks(db, user_id=current_user.id, limit=SUMMARY_TASK_LIMIT)
     task_summary_list = []
-    for t in tasks:
-        if t.status != "completed": # Focus AI on what's left
-            task_summary_list.append({
-                "title": t.title,
-                "category": t.category,
-                "priority": t.priority,
-                "deadline": str(t.deadline) if t.deadline else "None"
-            })
+    for t in pending_tasks:
+        task_summary_list.append({
+            "title": t.title,
+            "category": t.category,
+            "priority": t.priority,
+            "deadline": str(t.deadline) if t.deadline else "None"
+        })
 
     # 3. Prompt Engineering for JSON Output
     prompt = f"""
@@ -81,7 +128,7 @@ async def generate_summary(current_user: models.User = Depends(get_current_user)
     - High Priority Pending: {high_priority}
 
     Pending Tasks:
-    {json.dumps(task_summary_list[:20], indent=2)} 
+    {json.dumps(task_summary_list, indent=2)} 
     (List truncated to top 20 if too long)
 
     Return a JSON object with exactly this structure:
@@ -103,60 +150,126 @@ async def generate_summary(current_user: models.User = Depends(get_current_user)
     - Do NOT return markdown formatting, just raw JSON.
     """
 
-    payload = {
-        "contents": [{
-            "parts": [{"text": prompt}]
-        }]
-    }
-
-    # 4. Call Gemini
-    ai_insights = []
-    ai_actions = []
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(GEMINI_API_URL, json=payload, timeout=30.0)
-            response.raise_for_status()
-            data = response.json()
-            
-            text_response = data["candidates"][0]["content"]["parts"][0]["text"]
-            
-            # Clean up potential markdown code blocks
-            text_response = text_response.replace("```json", "").replace("```", "").strip()
-            
-            parsed_ai = json.loads(text_response)
-            ai_insights = parsed_ai.get("insights", [])
-            ai_actions = parsed_ai.get("actionItems", [])
-
-        except Exception as e:
-            print(f"AI Generation failed: {e}")
-            # Fallback if AI fails
-            ai_insights = [{
-                "type": "info",
-                "title": "AI Unavailable",
-                "description": "Could not generate personalized insights at this time."
-            }]
-            ai_actions = ["Focus on high priority tasks", "Check your deadlines"]
-
-    # 5. Get Top Priority Tasks (Local Logic)
-    # Sort by deadline (asc) then priority (high > medium > low)
-    # For simplicity here, just taking the high_priority_tasks list we already filtered
-    # and sorting by deadline.
-    
-    def task_sort_key(t):
-        # Sort by deadline (nulls last), then priority
-        d = t.deadline if t.deadline else datetime.max.replace(tzinfo=timezone.utc)
-        p_rank = {"high": 0, "medium": 1, "low": 2}.get(t.priority, 3)
-        return (d, p_rank)
+    # 4. Get Top Priority Tasks (Local Logic)
+    top_tasks = [schemas.Task.model_validate(t) for t in pending_tasks[:3]]
+
+    return stats, top_tasks, prompt
+
+
+async def coalesced_insights(user_id: str, prompt: str):
+    # Concurrent requests with the same inputs share a single computation
+    cache_key = summary_cache.fingerprint(gemini_client.model, prompt)
+    return await summary_flight.do(
+        f"{user_id}:{cache_key}", lambda: generate_insights(prompt, cache_key)
+    )
 
-    top_tasks_objects = sorted(
-        [t for t in tasks if t.status != "completed"], 
-        key=task_sort_key
-    )[:3]
+
+def require_gemini_key():
+    if not gemini_client.api_key:
+        raise HTTPException(
+            status_code=500, detail="Gemini API Key not configured")
+
+
+@router.post("/summary", response_model=schemas.AISummaryResponse)
+async def generate_summary(current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    require_gemini_key()
+    stats, top_tasks, prompt = await prepare_summary(current_user, db)
+
+    # Call Gemini (unless an identical prompt was answered recently)
+    ai_insights, ai_actions = await coalesced_insights(current_user.id, prompt)
 
     return schemas.AISummaryResponse(
         stats=stats,
         insights=ai_insights,
         actionItems=ai_actions,
-        topTasks=top_tasks_objects
+        topTasks=top_tasks
+    )
+
+
+def ndjson_event(event: str, data) -> str:
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+
+@router.post("/summary/stream")
+async def stream_summary(current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    """
+    Streaming variant of /ai/summary as newline-delimited JSON.
+    
+    Emits a "stats" and a "topTasks" event as soon as the database work is
+    done, then an "insights" event ({insights, actionItems}) once the model
+    answers or the fallback is chosen.
+    """
+    require_gemini_key()
+    # All database work happens before streaming starts; the session is
+    # released once this handler returns.
+    stats, top_tasks, prompt = await prepare_summary(current_user, db)
+    user_id = current_user.id
+
+    async def events():
+        yield ndjson_event("stats", stats.model_dump())
+        yield ndjson_event("topTasks", [t.model_dump(mode="json") for t in top_tasks])
+        ai_insights, ai_actions = await coalesced_insights(user_id, prompt)
+        yield ndjson_event("insights", {"insights": ai_insights, "actionItems": ai_actions})
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def job_response(job: dict) -> schemas.SummaryJob:
+    return schemas.SummaryJob(
+        id=job["id"],
+        status=job["status"],
+        created_at=job["created_at"],
+        finished_at=job["finished_at"],
+        result=job["result"],
+        error=job["error"],
     )
+
+
+@router.post("/summary/jobs", response_model=schemas.SummaryJob, status_code=status.HTTP_202_ACCEPTED)
+async def submit_summary_job(current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    """
+    Start generating a summary in the background and return its job.
+    
+    Poll GET /ai/summary/jobs/{job_id} for the result. If the user already
+    has a summary job queued or running, that job is returned instead.
+    """
+    require_gemini_key()
+    # Skip the database work entirely when a job is already in progress;
+    # submit checks again under its own lock, so racing requests still share one job
+    active = await summary_jobs.get_active(current_user.id)
+    if active is not None:
+        return job_response(active)
+
+    stats, top_tasks, prompt = await prepare_summary(current_user, db)
+    user_id = current_user.id
+
+    async def run():
+        ai_insights, ai_actions = await coalesced_insights(user_id, prompt)
+        return schemas.AISummaryResponse(
+            stats=stats,
+            insights=ai_insights,
+            actionItems=ai_actions,
+            topTasks=top_tasks
+        ).model_dump(mode="json")
+
+    try:
+        job, _ = await summary_jobs.submit(user_id, run)
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Too many summary jobs queued, please retry",
+                            headers={"Retry-After": "5"})
+    except JobConflict:
+        raise HTTPException(status_code=409, detail="A summary job was just started elsewhere, please retry",
+                            headers={"Retry-After": "1"})
+    return job_response(job)
+
+
+@router.get("/summary/jobs/{job_id}", response_model=schemas.SummaryJob)
+async def read_summary_job(job_id: str, current_user: models.User = Depends(get_current_user)):
+    job = await summary_jobs.get(job_id)
+    if job is None or job["owner_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
+from typing import Optional
+import json
+import os
+import database
+import schemas
+from routers.tasks import authenticate_token, get_current_user
+from services.change_feed import FeedFull, Subscription, change_feed
+from utils import create_access_token
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"],
+)
+
+# Comment lines sent while idle keep proxies from closing the stream
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", 3000))
+# Lifetime of the stream tokens EventSource clients put in the URL
+EVENTS_TOKEN_EXPIRE_SECONDS = int(os.getenv("EVENTS_TOKEN_EXPIRE_SECONDS", 60))
+EVENTS_TOKEN_PURPOSE = "events"
+
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+
+def sse_message(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def sse_stream(subscription: Subscription, heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS):
+    """
+    Relay a subscription as Server-Sent Events until the client goes away.
+    
+    Ends after a "resync" caused by buffer overflow; the client reconnects
+    (EventSource does so automatically) and refetches.
+    """
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            event = await subscription.get(timeout=heartbeat_seconds)
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_message(event)
+            if subscription.closed and subscription.queue.empty():
+                break
+    finally:
+        change_feed.unsubscribe(subscription)
+
+
+@router.post("/token")
+async def create_stream_token(current_user: schemas.User = Depends(get_current_user)):
+    """
+    Issue a short-lived token for opening an event stream.
+
+    For clients that cannot set headers (EventSource): pass it as
+    `?token=` to GET /events/. It is only accepted there, so the access
+    token itself never appears in a URL.
+    """
+    token = create_access_token(
+        data={"sub": current_user.email, "purpose": EVENTS_TOKEN_PURPOSE},
+        expires_delta=timedelta(seconds=EVENTS_TOKEN_EXPIRE_SECONDS),
+    )
+    return {"token": token, "expires_in": EVENTS_TOKEN_EXPIRE_SECONDS}
+
+
+@router.get("/")
+async def stream_events(
+    token: Optional[str] = Query(None, description="Stream token from POST /events/token, for clients that cannot set headers (EventSource)"),
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    Stream the current user's task and subtask changes as Server-Sent Events.
+    
+    Events carry IDs only ("task.created", "task.updated", "task.deleted",
+    "tasks.*" for bulk writes, "subtask.*"); clients refetch what they show,
+    cheaply thanks to ETags. A "resync" event means changes may have been
+    missed and the client should reload.
+    """
+    if header_token:
+        current_user = await get_current_user(token=header_token, db=db)
+    elif token:
+        current_user = await authenticate_token(token, db, purpose=EVENTS_TOKEN_PURPOSE)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    # The session is only needed to authenticate; do not hold it while streaming
+    await db.close()
+    try:
+        subscription = await change_feed.subscribe(current_user.id)
+    except FeedFull:
+        raise HTTPException(status_code=503, detail="Too many event streams", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        sse_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,56 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+import database
+import logging
+import time
+
+logger = logging.getLogger("taskflow.health")
+
+router = APIRouter(
+    prefix="/health",
+    tags=["health"],
+)
+
+
+@router.get("/db")
+async def database_health():
+    """
+    Check database connectivity and report connection pool statistics.
+    """
+    started = time.perf_counter()
+    try:
+        async with database.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        # The endpoint is public; driver errors can name hosts and users
+        logger.exception("Database health check failed")
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "pool": database.pool_status()},
+        )
+    health = {
+        "status": "ok",
+        "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+        "pool": database.pool_status(),
+    }
+    if database.replica_engine is not None:
+        health["replica"] = await replica_health()
+    return health
+
+
+async def replica_health():
+    # Reported alongside the primary; read-only routes fail while it is down
+    started = time.perf_counter()
+    try:
+        async with database.replica_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        logger.exception("Replica health check failed")
+        return {"status": "unavailable"}
+    return {
+        "status": "ok",
+        "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+        "pool": database.pool_status(database.replica_engine),
+        "routing": database.primary_pins.stats(),
+    }
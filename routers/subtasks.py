@@ -4,9 +4,12 @@ from typing import List
 import schemas
 import database
 import models
-from routers.tasks import get_current_user
+from routers.tasks import get_current_user, get_read_db
+from services import crud_service as crud
+from services.change_feed import change_feed
 from sqlalchemy.future import select
-from sqlalchemy import update, delete
+from sqlalchemy import insert, update, delete, literal
+import uuid
 
 router = APIRouter(
     prefix="/tasks/{task_id}/subtasks",
@@ -14,14 +17,34 @@ router = APIRouter(
 )
 
 
-async def get_subtask(db: AsyncSession, subtask_id: str, task_id: str):
-    result = await db.execute(
-        select(models.Subtask).filter(
-            models.Subtask.id == subtask_id,
-            models.Subtask.task_id == task_id
-        )
+def owned_task_ids(task_id: str, user_id: str, lock: bool = False):
+    # Ownership check folded into each statement as a subquery. Writes lock
+    # the task row (FOR NO KEY UPDATE on PostgreSQL), so concurrent subtask
+    # writes to one task queue up and each recount sees the others' rows
+    query = select(models.Task.id).filter(
+        models.Task.id == task_id,
+        models.Task.owner_id == user_id
     )
-    return result.scalars().first()
+    return query.with_for_update(key_share=True) if lock else query
+
+
+async def raise_not_found(db: AsyncSession, task_id: str, user_id: str):
+    # Only runs on the failure path, to tell a missing task from a missing subtask
+    task_result = await db.execute(owned_task_ids(task_id, user_id))
+    if task_result.first() is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    raise HTTPException(status_code=404, detail="Subtask not found")
+
+
+async def commit_detached(db: AsyncSession, db_subtask: models.Subtask, user_id: str, event_type: str):
+    # Every successful write lands here: bump the owner's task revision in
+    # the same transaction, detach so the returned row is not expired, and
+    # publish the change with it
+    await crud.bump_task_revision(db, user_id)
+    await change_feed.publish(user_id, event_type, db, task_id=db_subtask.task_id, subtask_id=db_subtask.id)
+    db.expunge(db_subtask)
+    await db.commit()
+    return db_subtask
 
 
 @router.post("/", response_model=schemas.Subtask)
@@ -31,45 +54,50 @@ async def create_subtask(
     current_user: models.User = Depends(get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
-    # Verify task exists and belongs to user
-    task_result = await db.execute(
-        select(models.Task).filter(
-            models.Task.id == task_id,
-            models.Task.owner_id == current_user.id
-        )
+    # INSERT ... SELECT FROM tasks WHERE owned: no row is inserted unless
+    # the task exists and belongs to the user
+    source = select(
+        literal(str(uuid.uuid4()), models.Subtask.id.type),
+        literal(subtask.title, models.Subtask.title.type),
+        literal(bool(subtask.is_completed), models.Subtask.is_completed.type),
+        literal(models.utcnow(), models.Subtask.updated_at.type),
+        models.Task.id,
+    ).filter(
+        models.Task.id == task_id,
+        models.Task.owner_id == current_user.id
+    ).with_for_update(key_share=True)
+    result = await db.execute(
+        insert(models.Subtask)
+        .from_select(["id", "title", "is_completed", "updated_at", "task_id"], source)
+        .returning(models.Subtask)
     )
-    task = task_result.scalars().first()
-    if not task:
+    db_subtask = result.scalars().first()
+    if not db_subtask:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    db_subtask = models.Subtask(**subtask.dict(), task_id=task_id)
-    db.add(db_subtask)
-    await db.commit()
-    await db.refresh(db_subtask)
-    return db_subtask
+    await crud.refresh_subtask_counts(db, task_id)
+    return await commit_detached(db, db_subtask, current_user.id, "subtask.created")
 
 
 @router.get("/", response_model=List[schemas.Subtask])
 async def read_subtasks(
     task_id: str,
     current_user: models.User = Depends(get_current_user),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    # Verify task exists and belongs to user
-    task_result = await db.execute(
-        select(models.Task).filter(
+    # Outer join from the owned task: no rows means the task is not found,
+    # a single row with no subtask means the task has none.
+    result = await db.execute(
+        select(models.Task.id, models.Subtask)
+        .outerjoin(models.Subtask, models.Subtask.task_id == models.Task.id)
+        .filter(
             models.Task.id == task_id,
             models.Task.owner_id == current_user.id
         )
     )
-    task = task_result.scalars().first()
-    if not task:
+    rows = result.all()
+    if not rows:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    result = await db.execute(
-        select(models.Subtask).filter(models.Subtask.task_id == task_id)
-    )
-    return result.scalars().all()
+    return [row.Subtask for row in rows if row.Subtask is not None]
 
 
 @router.put("/{subtask_id}", response_model=schemas.Subtask)
@@ -80,30 +108,34 @@ async def update_subtask(
     current_user: models.User = Depends(get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
-    # Verify task exists and belongs to user
-    task_result = await db.execute(
-        select(models.Task).filter(
-            models.Task.id == task_id,
-            models.Task.owner_id == current_user.id
+    update_data = subtask.model_dump(exclude_unset=True)
+    if not update_data:
+        result = await db.execute(
+            select(models.Subtask).filter(
+                models.Subtask.id == subtask_id,
+                models.Subtask.task_id.in_(owned_task_ids(task_id, current_user.id))
+            )
         )
-    )
-    task = task_result.scalars().first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    db_subtask = await get_subtask(db, subtask_id, task_id)
+    else:
+        result = await db.execute(
+            update(models.Subtask)
+            .where(
+                models.Subtask.id == subtask_id,
+                models.Subtask.task_id.in_(owned_task_ids(task_id, current_user.id, lock=True))
+            )
+            .values(**update_data)
+            .returning(models.Subtask)
+            .execution_options(synchronize_session=False)
+        )
+    db_subtask = result.scalars().first()
     if not db_subtask:
-        raise HTTPException(status_code=404, detail="Subtask not found")
-    
-    update_data = subtask.dict(exclude_unset=True)
-    await db.execute(
-        update(models.Subtask)
-        .where(models.Subtask.id == subtask_id)
-        .values(**update_data)
-    )
-    await db.commit()
-    await db.refresh(db_subtask)
-    return db_subtask
+        await raise_not_found(db, task_id, current_user.id)
+    if not update_data:
+        # Nothing changed: no revision bump and no event
+        return db_subtask
+    # Also touches the task's updated_at, so title-only edits reach delta sync
+    await crud.refresh_subtask_counts(db, task_id)
+    return await commit_detached(db, db_subtask, current_user.id, "subtask.updated")
 
 
 @router.delete("/{subtask_id}", response_model=schemas.Subtask)
@@ -113,23 +145,17 @@ async def delete_subtask(
     current_user: models.User = Depends(get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
-    # Verify task exists and belongs to user
-    task_result = await db.execute(
-        select(models.Task).filter(
-            models.Task.id == task_id,
-            models.Task.owner_id == current_user.id
+    result = await db.execute(
+        delete(models.Subtask)
+        .where(
+            models.Subtask.id == subtask_id,
+            models.Subtask.task_id.in_(owned_task_ids(task_id, current_user.id, lock=True))
         )
+        .returning(models.Subtask)
+        .execution_options(synchronize_session=False)
     )
-    task = task_result.scalars().first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    db_subtask = await get_subtask(db, subtask_id, task_id)
+    db_subtask = result.scalars().first()
     if not db_subtask:
-        raise HTTPException(status_code=404, detail="Subtask not found")
-    
-    await db.execute(
-        delete(models.Subtask).where(models.Subtask.id == subtask_id)
-    )
-    await db.commit()
-    return db_subtask
+        await raise_not_found(db, task_id, current_user.id)
+    await crud.refresh_subtask_counts(db, task_id)
+    return await commit_detached(db, db_subtask, current_user.id, "subtask.deleted")
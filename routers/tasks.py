@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from services import crud_service as crud
+from pydantic import Field, TypeAdapter, ValidationError
+from typing import Annotated, Any, List, Optional, Union
+from datetime import datetime
+import hashlib
+import json
+from services import crud_service as crud, task_transfer
+from services.auth_cache import principal_cache
 import schemas
 import database
 import models
 from utils import ALGORITHM, SECRET_KEY
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
 
 router = APIRouter(
     prefix="/tasks",
@@ -16,8 +21,37 @@ router = APIRouter(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Maximum number of items accepted by one /tasks/bulk request
+BULK_MAX_ITEMS = 1000
+
+# Clients may reuse a cached response but must revalidate it first
+TASK_CACHE_CONTROL = "private, no-cache"
+
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_db)):
+    # Tokens are only cached after a successful decode and lookup, and the
+    # entry never outlives the token's exp claim.
+    cached_user = principal_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+    return await authenticate_token(token, db)
+
+
+async def authenticate_token(token: str, db: AsyncSession, purpose: Optional[str] = None):
+    """
+    Resolve a JWT to its user.
+
+    Access tokens carry no purpose claim; single-purpose tokens (such as
+    event stream tokens) are only accepted where that purpose is asked for,
+    and are never cached.
+
+    Raises:
+        HTTPException: 401 if the token is invalid, expired, for another
+            purpose or for an unknown user
+    """
+    # Imported on first use to keep worker start-up fast
+    from jose import jwt, JWTError
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -26,14 +60,63 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("purpose") != purpose:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     user = await crud.get_user_by_email(db, email=email)
     if user is None:
         raise credentials_exception
-    return user
+    principal = schemas.User.model_validate(user)
+    if purpose is None:
+        principal_cache.set(token, email, principal, expires_at=payload.get("exp"))
+    return principal
+
+
+async def get_read_db(current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(database.get_db)):
+    # Read-only routes only: the session may be bound to a lagging replica
+    async with database.read_session(current_user.id, db) as session:
+        yield session
+
+
+def task_etag(user_id: str, revision: int, *parts) -> str:
+    """Strong ETag for one representation of a user's tasks at a revision."""
+    raw = json.dumps([user_id, revision, *parts], default=str, sort_keys=True)
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": TASK_CACHE_CONTROL})
+
+
+sparse_task_adapter = TypeAdapter(schemas.TaskSparse)
+sparse_task_list_adapter = TypeAdapter(List[schemas.TaskSparse])
+
+# Documents both shapes; full reads are validated as Task only, since the
+# sparse variant is returned pre-serialized by sparse_response
+TaskResponse = Annotated[Union[schemas.Task, schemas.TaskSparse], Field(union_mode="left_to_right")]
+TaskListResponse = Annotated[Union[List[schemas.Task], List[schemas.TaskSparse]], Field(union_mode="left_to_right")]
+
+
+def parse_fields(fields: Optional[str]):
+    try:
+        return crud.parse_task_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def sparse_response(data, adapter: TypeAdapter, headers: dict) -> Response:
+    # Lightweight reads bypass the full Task response model; only the
+    # fields that were loaded get serialized.
+    body = adapter.dump_json(adapter.validate_python(data, from_attributes=True), exclude_unset=True)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.post("/", response_model=schemas.Task)
@@ -49,34 +132,327 @@ async def create_task(task: schemas.TaskCreate, current_user: models.User = Depe
     return await crud.create_task(db=db, task=task, user_id=current_user.id)
 
 
-@router.get("/", response_model=List[schemas.Task])
-async def read_tasks(skip: int = 0, limit: int = 100, current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(database.get_db)):
+@router.get("/", response_model=TaskListResponse)
+async def read_tasks(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+    priority: Optional[List[str]] = Query(None),
+    category: Optional[List[str]] = Query(None),
+    deadline_after: Optional[datetime] = None,
+    deadline_before: Optional[datetime] = None,
+    sort: str = Query(crud.DEFAULT_TASK_SORT, pattern="^-?(created_at|deadline)$"),
+    include: str = Query("subtasks", pattern="^(subtasks|subtask_counts|none)$"),
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
-    Retrieve all tasks for the current user.
+    Retrieve tasks for the current user.
+    
+    Filters are combined with AND; repeating status, priority or category
+    matches any of the given values. When more tasks remain, the cursor for
+    the next page is returned in the X-Next-Cursor header.
+    
+    Responses carry an ETag derived from the user's task revision and the
+    query; a matching If-None-Match gets 304 without querying tasks.
+    
+    include=subtask_counts or include=none skip loading subtasks, and
+    fields=title,status,... returns only those columns (plus id).
     
     Args:
-        skip: Pagination skip
+        skip: Legacy offset pagination (prefer cursor)
         limit: Pagination limit
+        cursor: Cursor from a previous X-Next-Cursor header
+        status: Only tasks with one of these statuses
+        priority: Only tasks with one of these priorities
+        category: Only tasks in one of these categories
+        deadline_after: Only tasks due at or after this time
+        deadline_before: Only tasks due before this time
+        sort: created_at or deadline, prefix with "-" for descending
+        include: subtasks (default), subtask_counts or none
+        fields: Comma-separated task columns to return
+        if_none_match: ETag from a previous response
         current_user: Authenticated user
         db: Database session
     """
-    tasks = await crud.get_tasks(db, skip=skip, limit=limit, user_id=current_user.id)
+    filters = schemas.TaskFilters(
+        status=status,
+        priority=priority,
+        category=category,
+        deadline_after=deadline_after,
+        deadline_before=deadline_before,
+    )
+    selected_fields = parse_fields(fields)
+    # Read the revision before the tasks: a write landing in between only
+    # makes the ETag older than the body, which costs a refetch, never a
+    # stale 304.
+    revision = await crud.get_task_revision(db, current_user.id)
+    etag = task_etag(current_user.id, revision, "list", skip, limit, cursor, filters.model_dump(mode="json"), sort,
+                     include, selected_fields)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    try:
+        tasks, next_cursor = await crud.get_task_page(
+            db, user_id=current_user.id, limit=limit, cursor=cursor, skip=skip, filters=filters, sort=sort,
+            include=include, fields=selected_fields)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    headers = {"ETag": etag, "Cache-Control": TASK_CACHE_CONTROL}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if include != "subtasks" or selected_fields is not None:
+        return sparse_response(tasks, sparse_task_list_adapter, headers)
+    response.headers.update(headers)
     return tasks
 
 
-@router.get("/{task_id}", response_model=schemas.Task)
-async def read_task(task_id: str, current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(database.get_db)):
+@router.get("/stats", response_model=schemas.AIStats)
+async def read_task_stats(current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    """
+    Retrieve task counts and completion rate for the current user.
+    
+    Args:
+        current_user: Authenticated user
+        db: Database session
+    """
+    return await crud.get_task_stats(db, user_id=current_user.id)
+
+
+@router.get("/search", response_model=List[schemas.TaskSearchResult])
+async def search_tasks(
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Search task titles and descriptions, best matches first.
+    
+    Args:
+        q: Search words; all of them must match
+        skip: Number of results to skip
+        limit: Page size
+        current_user: Authenticated user
+        db: Database session
+    """
+    return await crud.search_tasks(db, user_id=current_user.id, q=q, skip=skip, limit=limit)
+
+
+@router.get("/changes", response_model=schemas.TaskChanges)
+async def read_task_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    Delta sync: tasks changed and deleted since a previous sync.
+
+    Always reads the primary: rows missing from a lagging replica would
+    fall behind the returned token and never be sent.
+
+    Args:
+        since: next_token from the previous response; omit for a full sync
+        limit: Maximum number of changed tasks per response
+        current_user: Authenticated user
+        db: Database session
+    """
+    try:
+        return await crud.get_task_changes(db, user_id=current_user.id, since=since, limit=limit)
+    except crud.SyncTokenExpired:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Sync token expired; run a full sync")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+@router.get("/export")
+async def export_tasks(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: models.User = Depends(get_current_user),
+    session_factory=Depends(database.get_sessionmaker)
+):
+    """
+    Download every task with its subtasks, oldest first, as NDJSON or CSV.
+
+    The body is streamed from a server-side cursor as it is read, so memory
+    use does not grow with the number of tasks.
+
+    Args:
+        format: ndjson (one task object per line) or csv (subtasks as a JSON column)
+        current_user: Authenticated user
+        session_factory: Opens the session the body reads from
+    """
+    writer = task_transfer.csv_lines if format == "csv" else task_transfer.ndjson_lines
+
+    async def body():
+        # Runs after the handler's dependencies are torn down, so the stream
+        # owns its session for exactly as long as it is read
+        async with session_factory() as primary, database.read_session(current_user.id, primary) as db:
+            async for chunk in writer(crud.stream_task_export(db, current_user.id)):
+                yield chunk
+
+    return StreamingResponse(body(), media_type=EXPORT_MEDIA_TYPES[format], headers={
+        "Content-Disposition": f'attachment; filename="tasks.{format}"',
+        "Cache-Control": "no-store",
+    })
+
+
+@router.post("/import", response_model=schemas.TaskImportResult)
+async def import_tasks(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    Create tasks and subtasks from an NDJSON or CSV request body.
+
+    Accepts the output of GET /tasks/export; IDs in the file are ignored
+    and new ones assigned. The body is parsed as it arrives and written in
+    batches, each its own transaction, with "tasks.import_progress" events
+    on the change feed. Invalid records are skipped and reported; if the
+    stream itself cannot be read the response is 400, with the records
+    before that point already imported.
+
+    Args:
+        request: Raw upload, read incrementally
+        format: ndjson or csv; defaults from the Content-Type
+        current_user: Authenticated user
+        db: Database session
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    parse = task_transfer.csv_records if format == "csv" else task_transfer.ndjson_records
+    result = await crud.import_tasks(db, current_user.id, parse(request.stream()))
+    if result.aborted:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=result.model_dump())
+    return result
+
+
+def validate_bulk_items(items: List[Any], schema):
+    """
+    Validate each raw item on its own so one bad item does not fail the batch.
+    
+    Returns:
+        Tuple of (list of (index, model) for valid items, list of BulkItemResult for invalid ones)
+    """
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per request")
+    valid, invalid = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.model_validate(item)))
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            item_id = item.get("id") if isinstance(item, dict) else None
+            invalid.append(schemas.BulkItemResult(index=index, id=item_id, status="invalid", error=error))
+    return valid, invalid
+
+
+def bulk_result(results: List[schemas.BulkItemResult], success_status: str) -> schemas.BulkResult:
+    results.sort(key=lambda r: r.index)
+    succeeded = sum(1 for r in results if r.status == success_status)
+    return schemas.BulkResult(succeeded=succeeded, failed=len(results) - succeeded, results=results)
+
+
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def bulk_create_tasks(items: List[Any] = Body(...), current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(database.get_db)):
+    """
+    Create many tasks in one transaction.
+    
+    Each item is validated independently; invalid items are reported and
+    skipped while the valid ones are inserted together.
+    """
+    valid, results = validate_bulk_items(items, schemas.TaskCreate)
+    task_ids = await crud.bulk_create_tasks(db, [task for _, task in valid], user_id=current_user.id)
+    for (index, _), task_id in zip(valid, task_ids):
+        results.append(schemas.BulkItemResult(index=index, id=task_id, status="created"))
+    return bulk_result(results, "created")
+
+
+@router.patch("/bulk", response_model=schemas.BulkResult)
+async def bulk_update_tasks(items: List[Any] = Body(...), current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(database.get_db)):
+    """
+    Partially update many tasks in one transaction.
+    
+    Each item needs an "id" plus the fields to change.
+    """
+    valid, results = validate_bulk_items(items, schemas.TaskBulkUpdateItem)
+    to_update, seen = [], set()
+    for index, item in valid:
+        if item.id in seen:
+            results.append(schemas.BulkItemResult(index=index, id=item.id, status="invalid", error="Duplicate id"))
+        elif not item.model_fields_set - {"id"}:
+            results.append(schemas.BulkItemResult(index=index, id=item.id, status="invalid", error="No fields to update"))
+        else:
+            seen.add(item.id)
+            to_update.append((index, item))
+
+    updated = await crud.bulk_update_tasks(db, [item for _, item in to_update], user_id=current_user.id)
+    for index, item in to_update:
+        results.append(schemas.BulkItemResult(
+            index=index, id=item.id, status="updated" if item.id in updated else "not_found"))
+    return bulk_result(results, "updated")
+
+
+@router.delete("/bulk", response_model=schemas.BulkResult)
+async def bulk_delete_tasks(body: schemas.TaskBulkDelete, current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(database.get_db)):
+    """
+    Delete many tasks, and their subtasks, in one transaction.
+    """
+    if len(body.ids) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per request")
+    deleted = await crud.bulk_delete_tasks(db, list(set(body.ids)), user_id=current_user.id)
+    results = [
+        schemas.BulkItemResult(index=index, id=task_id, status="deleted" if task_id in deleted else "not_found")
+        for index, task_id in enumerate(body.ids)
+    ]
+    return bulk_result(results, "deleted")
+
+
+@router.get("/{task_id}", response_model=TaskResponse)
+async def read_task(
+    task_id: str,
+    response: Response,
+    include: str = Query("subtasks", pattern="^(subtasks|subtask_counts|none)$"),
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Retrieve a specific task by ID.
     
+    Supports include, fields and If-None-Match like the task list.
+    
     Args:
         task_id: Task ID
+        include: subtasks (default), subtask_counts or none
+        fields: Comma-separated task columns to return
+        if_none_match: ETag from a previous response
         current_user: Authenticated user
         db: Database session
     """
-    task = await crud.get_task(db, task_id=task_id, user_id=current_user.id)
+    selected_fields = parse_fields(fields)
+    revision = await crud.get_task_revision(db, current_user.id)
+    etag = task_etag(current_user.id, revision, "task", task_id, include, selected_fields)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    task = await crud.get_task(db, task_id=task_id, user_id=current_user.id, include=include, fields=selected_fields)
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
+    headers = {"ETag": etag, "Cache-Control": TASK_CACHE_CONTROL}
+    if include != "subtasks" or selected_fields is not None:
+        return sparse_response(task, sparse_task_adapter, headers)
+    response.headers.update(headers)
     return task
 
 
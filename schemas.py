@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
 from datetime import datetime
+import json
 
 
 class UserBase(BaseModel):
@@ -47,16 +48,85 @@ class TaskUpdate(BaseModel):
     status: Optional[str] = None
 
 
+class TaskBulkUpdateItem(TaskUpdate):
+    id: str
+
+
+class TaskBulkDelete(BaseModel):
+    ids: List[str]
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    status: str  # created, updated, deleted, not_found, invalid
+    error: Optional[str] = None
+
+
+class BulkResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
+
+
+class TaskFilters(BaseModel):
+    status: Optional[List[str]] = None
+    priority: Optional[List[str]] = None
+    category: Optional[List[str]] = None
+    deadline_after: Optional[datetime] = None
+    deadline_before: Optional[datetime] = None
+
+
 class Task(TaskBase):
     id: str
     owner_id: str
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    subtask_total: int = 0
+    subtask_completed: int = 0
     subtasks: List['Subtask'] = []
 
     class Config:
         from_attributes = True
 
 
+class TaskSparse(BaseModel):
+    """
+    Lightweight task for ?include= / ?fields= reads.
+
+    Only the requested fields are set, and only set fields are serialized.
+    """
+    id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    category: Optional[str] = None
+    priority: Optional[str] = None
+    deadline: Optional[datetime] = None
+    status: Optional[str] = None
+    owner_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    subtask_total: Optional[int] = None
+    subtask_completed: Optional[int] = None
+    subtasks: Optional[List['Subtask']] = None
+
+
+class TaskSearchResult(TaskBase):
+    id: str
+    owner_id: str
+    created_at: datetime
+    subtask_total: int = 0
+    subtask_completed: int = 0
+    rank: float
+
+
+class TaskChanges(BaseModel):
+    changed: List[Task]  # created or modified since the token, with their current subtasks
+    deleted: List[str]  # IDs of tasks deleted since the token
+    next_token: str
+    has_more: bool  # call again with next_token right away
+
+
 # Subtask Schemas
 class SubtaskBase(BaseModel):
     title: str
@@ -75,6 +145,7 @@ class SubtaskUpdate(BaseModel):
 class Subtask(SubtaskBase):
     id: str
     task_id: str
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -101,3 +172,41 @@ class AISummaryResponse(BaseModel):
     actionItems: List[str]
     topTasks: List[Task]
 
+
+
+class SummaryJob(BaseModel):
+    id: str
+    status: str  # queued, running, succeeded, failed
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[AISummaryResponse] = None
+    error: Optional[str] = None
+
+
+# Import / Export Schemas
+class TaskImport(TaskCreate):
+    created_at: Optional[datetime] = None  # kept when present, so history keeps its order
+    subtasks: List[SubtaskCreate] = []
+
+    @field_validator('subtasks', mode='before')
+    def parse_subtasks(cls, v):
+        # CSV exports carry subtasks as a JSON array in one cell
+        if v is None or v == "":
+            return []
+        if isinstance(v, str):
+            return json.loads(v)
+        return v
+
+
+class TaskImportError(BaseModel):
+    line: int
+    error: str
+
+
+class TaskImportResult(BaseModel):
+    imported: int
+    subtasks: int
+    failed: int
+    batches: int
+    errors: List[TaskImportError]  # the first IMPORT_MAX_ERRORS failures
+    aborted: Optional[str] = None  # why reading stopped early; earlier records were still imported
@@ -0,0 +1,64 @@
+"""
+Local Gemini-compatible stub for load tests without network access.
+
+Serves POST /v1beta/models/{model}:generateContent with a canned JSON
+summary after a configurable delay, failing a configurable share of calls.
+
+    python scripts/gemini_stub.py --port 8090 --latency-ms 800 --error-rate 0.1
+    GEMINI_API_BASE_URL=http://127.0.0.1:8090 GEMINI_API_KEY=stub uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+CANNED_SUMMARY = {
+    "insights": [
+        {"type": "info", "title": "Stub Insight", "description": "Generated by the local Gemini stub."},
+        {"type": "warning", "title": "Deadlines Ahead", "description": "Some pending tasks are due soon."},
+        {"type": "success", "title": "Steady Progress", "description": "You are completing tasks regularly."},
+    ],
+    "actionItems": ["Finish the most urgent task first", "Review upcoming deadlines"],
+}
+
+
+def create_app(latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+               error_status: int = 503) -> FastAPI:
+    app = FastAPI(title="Gemini stub")
+    app.state.calls = 0
+
+    @app.post("/v1beta/models/{model_action}")
+    async def generate_content(model_action: str, request: Request):
+        app.state.calls += 1
+        await request.json()
+        delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if random.random() < error_rate:
+            return JSONResponse(status_code=error_status, content={"error": {"message": "stub failure"}})
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": json.dumps(CANNED_SUMMARY)}], "role": "model"},
+            }]
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status),
+        host=args.host, port=args.port, log_level="warning",
+    )
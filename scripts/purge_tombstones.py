@@ -0,0 +1,29 @@
+"""
+Delete task tombstones older than TOMBSTONE_RETENTION_DAYS (default 30).
+
+Tombstones let GET /tasks/changes report deletions; clients whose sync
+token is older than the retention window get 410 and do a full sync.
+Run this periodically, e.g. daily from cron.
+
+    python scripts/purge_tombstones.py
+"""
+import argparse
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+from services import crud_service as crud
+
+
+async def purge():
+    async with SessionLocal() as db:
+        purged = await crud.purge_tombstones(db)
+    print(f"Purged {purged} tombstone(s) older than {crud.TOMBSTONE_RETENTION_DAYS} day(s).")
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    asyncio.run(purge())
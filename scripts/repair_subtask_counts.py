@@ -0,0 +1,31 @@
+"""
+Recompute Task.subtask_total / Task.subtask_completed from the subtasks table.
+
+The counters are maintained by the subtask endpoints; run this after
+writing subtasks directly in the database, or after adding the columns
+to an existing database.
+
+    python scripts/repair_subtask_counts.py --batch-size 1000
+"""
+import argparse
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+from services import crud_service as crud
+
+
+async def repair(batch_size: int):
+    async with SessionLocal() as db:
+        repaired = await crud.repair_subtask_counts(db, batch_size=batch_size)
+    print(f"Repaired subtask counters on {repaired} task(s).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(repair(args.batch_size))
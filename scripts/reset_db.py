@@ -6,6 +6,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import engine, Base
 import models
+import services.task_search  # drops/creates the search index with the tasks table
 
 async def reset_db():
     async with engine.begin() as conn:
@@ -0,0 +1,42 @@
+"""
+Simulate a lagging read replica with two SQLite files.
+
+Copies the primary database file over the replica file every --interval
+seconds using SQLite's online backup, so the replica trails the primary by
+up to that long. Run the API with both URLs pointing at the files:
+
+    DATABASE_URL=sqlite+aiosqlite:///./app.db \\
+    DATABASE_REPLICA_URL=sqlite+aiosqlite:///./replica.db uvicorn main:app
+    python scripts/sync_sqlite_replica.py app.db replica.db --interval 5
+
+For two local PostgreSQL instances, use streaming replication instead and
+point DATABASE_REPLICA_URL at the standby.
+"""
+import argparse
+import sqlite3
+import time
+
+
+def copy_database(primary: str, replica: str):
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("primary")
+    parser.add_argument("replica")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between copies")
+    parser.add_argument("--once", action="store_true", help="Copy once and exit")
+    args = parser.parse_args()
+    while True:
+        copy_database(args.primary, args.replica)
+        print(f"Copied {args.primary} -> {args.replica}")
+        if args.once:
+            break
+        time.sleep(args.interval)
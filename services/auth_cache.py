@@ -0,0 +1,117 @@
+import os
+import time
+from collections import OrderedDict
+
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+
+class PrincipalCache:
+    """
+    In-process LRU cache of authenticated principals keyed by bearer token.
+
+    Entries live for at most `ttl_seconds` and never outlive the token's own
+    `exp` claim, so a cached principal is never served for an expired token.
+    """
+
+    def __init__(self, ttl_seconds: int = AUTH_CACHE_TTL_SECONDS, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (monotonic deadline, email, principal)
+        self._tokens_by_email = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        deadline, email, principal = entry
+        if deadline <= time.monotonic():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return principal
+
+    def peek(self, token: str):
+        """Like get, but leaves the hit counters and LRU order alone."""
+        entry = self._entries.get(token)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[2]
+
+    def set(self, token: str, email: str, principal, expires_at=None):
+        """
+        Cache a principal for a token.
+
+        Args:
+            token: Raw bearer token
+            email: Subject of the token, used for invalidation
+            principal: Object returned to route handlers
+            expires_at: The token's `exp` claim as a unix timestamp
+        """
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        ttl = self.ttl_seconds
+        if expires_at is not None:
+            ttl = min(ttl, float(expires_at) - time.time())
+        if ttl <= 0:
+            return
+
+        if token in self._entries:
+            self._remove(token)
+        self._entries[token] = (time.monotonic() + ttl, email, principal)
+        self._tokens_by_email.setdefault(email, set()).add(token)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_user(self, email: str):
+        """
+        Drop every cached token for a user.
+
+        Any write to a user's row (email, name, deletion) must call this
+        after committing, or other tokens keep serving the old principal
+        for up to ttl_seconds.
+        """
+        for token in self._tokens_by_email.pop(email, set()):
+            self._entries.pop(token, None)
+
+    def invalidate_token(self, token: str):
+        self._remove(token)
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_email.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_email.get(entry[1])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_email[entry[1]]
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_user(email: str):
+    principal_cache.invalidate_user(email)
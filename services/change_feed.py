@@ -0,0 +1,313 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from sqlalchemy import event as sa_event, text
+from sqlalchemy.orm import Session
+
+CHANGE_FEED_BACKEND = os.getenv("CHANGE_FEED_BACKEND", "memory")  # memory or postgres
+CHANGE_FEED_CHANNEL = os.getenv("CHANGE_FEED_CHANNEL", "taskflow_changes")
+CHANGE_FEED_MAX_CONNECTIONS = int(os.getenv("CHANGE_FEED_MAX_CONNECTIONS", 1000))
+CHANGE_FEED_MAX_CONNECTIONS_PER_USER = int(os.getenv("CHANGE_FEED_MAX_CONNECTIONS_PER_USER", 5))
+CHANGE_FEED_BUFFER_SIZE = int(os.getenv("CHANGE_FEED_BUFFER_SIZE", 100))
+CHANGE_FEED_RECONNECT_SECONDS = float(os.getenv("CHANGE_FEED_RECONNECT_SECONDS", 5))
+
+# Bulk events list at most this many IDs; larger batches send "resync"
+MAX_EVENT_IDS = 100
+
+logger = logging.getLogger("taskflow.change_feed")
+
+# Session.info key holding in-process events staged in an open transaction
+PENDING_EVENTS_KEY = "change_feed_pending"
+
+
+class FeedFull(Exception):
+    """Raised when a new subscription would exceed the connection limits."""
+
+
+class Subscription:
+    """
+    One connected client: a bounded buffer of events for one user.
+
+    A client that falls `buffer_size` events behind is not allowed to hold
+    memory: its buffer is replaced by a single "resync" event and the
+    subscription is closed, so it reconnects and refetches.
+    """
+
+    def __init__(self, user_id: str, buffer_size: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.closed = False
+
+    def offer(self, event: dict) -> bool:
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "reason": "buffer_overflow"})
+            self.closed = True
+            return False
+
+    async def get(self, timeout: float = None):
+        """Next event, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _deliver_pending_events(session):
+    for deliver, user_id, event in session.info.pop(PENDING_EVENTS_KEY, ()):
+        deliver(user_id, event)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _drop_pending_events(session):
+    session.info.pop(PENDING_EVENTS_KEY, None)
+
+
+class InProcessBroker:
+    """
+    Single-worker pub/sub delivering straight to local subscribers.
+
+    An event published with a session is held on it and delivered when
+    that session commits, or dropped if it rolls back.
+    """
+
+    def __init__(self):
+        self._deliver = None
+
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def publish(self, user_id: str, event: dict, session=None):
+        if session is None:
+            self._deliver(user_id, event)
+        else:
+            session.sync_session.info.setdefault(PENDING_EVENTS_KEY, []).append((self._deliver, user_id, event))
+
+
+def asyncpg_dsn(url: str) -> str:
+    # database.py rewrites URLs for SQLAlchemy; asyncpg.connect wants libpq form
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1).replace("ssl=require", "sslmode=require")
+
+
+class PostgresBroker:
+    """
+    Multi-worker pub/sub over PostgreSQL LISTEN/NOTIFY.
+
+    Every worker LISTENs on one channel over a dedicated connection. A
+    publish is a pg_notify in the write's own transaction, so PostgreSQL
+    sends it when, and only if, the write commits; each worker (the
+    publisher included) then delivers it to its own subscribers. Payloads
+    are kept to IDs because NOTIFY payloads are limited to 8000 bytes.
+    """
+
+    def __init__(self, dsn: str, channel: str = CHANGE_FEED_CHANNEL,
+                 reconnect_seconds: float = CHANGE_FEED_RECONNECT_SECONDS):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self._deliver = None
+        self._listen_conn = None
+        self._reconnect_task = None
+
+    async def start(self, deliver):
+        import asyncpg
+
+        self._deliver = deliver
+        self._listen_conn = await asyncpg.connect(self.dsn)
+        self._listen_conn.add_termination_listener(self._on_terminated)
+        await self._listen_conn.add_listener(self.channel, self._on_notify)
+
+    async def stop(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        await self._close_connections()
+
+    async def _close_connections(self):
+        if self._listen_conn is not None and not self._listen_conn.is_closed():
+            await self._listen_conn.close(timeout=5)
+        self._listen_conn = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+            self._deliver(message["user_id"], message["event"])
+        except (ValueError, KeyError) as e:
+            logger.warning("Ignoring malformed change notification: %s", e)
+
+    def _on_terminated(self, connection):
+        logger.warning("Change feed LISTEN connection lost, reconnecting")
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while True:
+            await asyncio.sleep(self.reconnect_seconds)
+            try:
+                await self._close_connections()
+                await self.start(self._deliver)
+            except Exception as e:
+                logger.warning("Change feed reconnect failed: %s", e)
+                continue
+            # Events published while disconnected were lost
+            self._deliver(None, {"type": "resync", "reason": "feed_reconnected"})
+            return
+
+    async def publish(self, user_id: str, event: dict, session=None):
+        if session is None:
+            raise ValueError("PostgresBroker publishes inside a write transaction; pass its session")
+        payload = json.dumps({"user_id": user_id, "event": event})
+        await session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+
+
+class ChangeFeed:
+    """
+    Per-user task/subtask change events for push clients.
+
+    Write paths publish with their session before they commit, so an event
+    goes out exactly when its write commits; connected clients hold a
+    Subscription. Total and per-user connections are capped, and each
+    subscription buffers at most `buffer_size` events.
+    """
+
+    def __init__(self, broker, max_connections: int = CHANGE_FEED_MAX_CONNECTIONS,
+                 max_connections_per_user: int = CHANGE_FEED_MAX_CONNECTIONS_PER_USER,
+                 buffer_size: int = CHANGE_FEED_BUFFER_SIZE):
+        self.broker = broker
+        self.max_connections = max_connections
+        self.max_connections_per_user = max_connections_per_user
+        self.buffer_size = buffer_size
+        self._subscriptions = {}  # user_id -> set of Subscription
+        self.connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.overflowed = 0
+        self.rejected = 0
+        self.publish_failures = 0
+        self._loop = None
+
+    async def _ensure_started(self):
+        # Broker connections belong to one event loop; restart on a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Claimed before awaiting so concurrent first callers start it once
+        self._loop = loop
+        try:
+            await self.broker.start(self._deliver)
+        except Exception:
+            self._loop = None
+            raise
+
+    async def start(self):
+        await self._ensure_started()
+
+    async def stop(self):
+        await self.broker.stop()
+        self._loop = None
+
+    async def subscribe(self, user_id: str) -> Subscription:
+        """
+        Register a new client for a user's events.
+
+        Raises:
+            FeedFull: If the total or per-user connection limit is reached
+        """
+        await self._ensure_started()
+        user_subscriptions = self._subscriptions.setdefault(user_id, set())
+        if self.connections >= self.max_connections or len(user_subscriptions) >= self.max_connections_per_user:
+            self.rejected += 1
+            if not user_subscriptions:
+                del self._subscriptions[user_id]
+            raise FeedFull()
+        subscription = Subscription(user_id, self.buffer_size)
+        user_subscriptions.add(subscription)
+        self.connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.closed = True
+        user_subscriptions = self._subscriptions.get(subscription.user_id)
+        if user_subscriptions is None or subscription not in user_subscriptions:
+            return
+        user_subscriptions.discard(subscription)
+        self.connections -= 1
+        if not user_subscriptions:
+            del self._subscriptions[subscription.user_id]
+
+    def _deliver(self, user_id, event: dict):
+        # user_id None broadcasts to every local subscriber
+        if user_id is None:
+            targets = [s for subscriptions in self._subscriptions.values() for s in subscriptions]
+        else:
+            targets = list(self._subscriptions.get(user_id, ()))
+        for subscription in targets:
+            if subscription.offer(event):
+                self.delivered += 1
+            else:
+                self.overflowed += 1
+
+    async def publish(self, user_id: str, event_type: str, session=None, **fields):
+        """
+        Publish a change event to a user's subscribers.
+
+        Write paths pass their session and call this before committing:
+        the event is part of the transaction, sent when it commits and
+        dropped if it rolls back. Without a session (in-process broker
+        only) it is delivered immediately.
+        """
+        event = {"type": event_type, **fields, "at": time.time()}
+        try:
+            # Only local delivery needs the broker running; a NOTIFY does not
+            await self._ensure_started()
+        except Exception as e:
+            self.publish_failures += 1
+            logger.warning("Change feed broker unavailable: %s", e)
+        await self.broker.publish(user_id, event, session)
+        self.published += 1
+
+    async def publish_many(self, user_id: str, event_type: str, task_ids, session=None):
+        """Publish a bulk event, or "resync" when there are too many IDs to list."""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return
+        if len(task_ids) > MAX_EVENT_IDS:
+            await self.publish(user_id, "resync", session, reason=event_type, count=len(task_ids))
+        else:
+            await self.publish(user_id, event_type, session, task_ids=task_ids)
+
+    def stats(self):
+        return {
+            "backend": type(self.broker).__name__,
+            "connections": self.connections,
+            "users": len(self._subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflowed": self.overflowed,
+            "rejected": self.rejected,
+            "publish_failures": self.publish_failures,
+        }
+
+
+def create_broker(backend: str = CHANGE_FEED_BACKEND):
+    if backend == "postgres":
+        from database import DATABASE_URL
+        return PostgresBroker(asyncpg_dsn(DATABASE_URL))
+    if backend == "memory":
+        return InProcessBroker()
+    raise ValueError(f"Unknown CHANGE_FEED_BACKEND: {backend}")
+
+
+change_feed = ChangeFeed(create_broker())
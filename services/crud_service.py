@@ -2,21 +2,45 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete
+from sqlalchemy import insert, update, delete, tuple_, and_, or_, func, case
 from sqlalchemy.orm import selectinload
-from passlib.context import CryptContext
+from sqlalchemy.orm.attributes import set_committed_value
+from datetime import datetime, timedelta, timezone
+import base64
+import json
+import os
+import uuid
+import database
 import models
 import schemas
+from services import task_search
+from services.change_feed import change_feed
+from services.password_service import password_hasher
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Delta sync re-sends this window so rows whose transaction committed late are not missed
+SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", 5))
+# Tombstones older than this are purged; older sync tokens require a full resync
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", 30))
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
 
+# Rows fetched per round trip by the export cursor, and tasks per import transaction
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+# Import errors listed in the response; later ones are only counted
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", 50))
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+
+class SyncTokenExpired(Exception):
+    """Raised when a sync token predates the tombstone retention window."""
+
+
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
+
+
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
 async def get_user_by_email(db: AsyncSession, email: str):
@@ -45,7 +69,7 @@ async def create_user(db: AsyncSession, user: schemas.UserCreate):
     Returns:
         Created User model
     """
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         full_name=user.full_name,
@@ -57,29 +81,544 @@ async def create_user(db: AsyncSession, user: schemas.UserCreate):
     return db_user
 
 
+async def get_task_revision(db: AsyncSession, user_id: str) -> int:
+    """
+    Read a user's task revision without touching the task tables.
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        
+    Returns:
+        Current revision number
+    """
+    result = await db.execute(select(models.User.task_revision).filter(models.User.id == user_id))
+    return result.scalar() or 0
+
+
+async def bump_task_revision(db: AsyncSession, user_id: str):
+    """
+    Increment a user's task revision as part of the caller's transaction.
+    
+    Must be called by every write to the user's tasks or subtasks, before
+    the commit, so cached ETags stop matching. It also pins the user's
+    reads to the primary for READ_YOUR_WRITES_SECONDS.
+    """
+    database.primary_pins.record_write(user_id)
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(task_revision=models.User.task_revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Sortable columns for the task list: name -> (column, nullable)
+TASK_SORT_FIELDS = {
+    "created_at": (models.Task.created_at, False),
+    "deadline": (models.Task.deadline, True),
+}
+DEFAULT_TASK_SORT = "-created_at"
+
+
+def parse_task_sort(sort: str):
+    """
+    Parse a sort spec such as "deadline" or "-created_at".
+
+    Returns:
+        Tuple of (field name, descending)
+
+    Raises:
+        ValueError: If the field is not sortable
+    """
+    descending = sort.startswith("-")
+    field = sort.lstrip("-")
+    if field not in TASK_SORT_FIELDS:
+        raise ValueError(f"Cannot sort by {field}")
+    return field, descending
+
+
+def encode_task_cursor(task: models.Task, sort: str = DEFAULT_TASK_SORT) -> str:
+    """
+    Build an opaque pagination cursor pointing just past a task.
+
+    Args:
+        task: Last task of the current page, as a Task model or dict
+        sort: Sort spec the page was produced with
+
+    Returns:
+        URL-safe cursor string
+    """
+    field, _ = parse_task_sort(sort)
+    # Lightweight reads return plain dicts rather than Task models
+    if isinstance(task, dict):
+        value, task_id = task[field], task["id"]
+    else:
+        value, task_id = getattr(task, field), task.id
+    raw = json.dumps([sort, value.isoformat() if value is not None else None, task_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_task_cursor(cursor: str, sort: str = DEFAULT_TASK_SORT):
+    """
+    Decode a cursor produced by encode_task_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed or was made for another sort
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, task_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if cursor_sort != sort:
+            raise ValueError("Cursor does not match sort order")
+        return (datetime.fromisoformat(value) if value is not None else None), str(task_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _keyset_after(column, nullable: bool, descending: bool, value, task_id: str):
+    # Rows sort as (column IS NULL, column, id) so NULLs always come last
+    if descending:
+        after = tuple_(column, models.Task.id) < tuple_(value, task_id)
+        after_null = models.Task.id < task_id
+    else:
+        after = tuple_(column, models.Task.id) > tuple_(value, task_id)
+        after_null = models.Task.id > task_id
+    if not nullable:
+        return after
+    if value is None:
+        return and_(column.is_(None), after_null)
+    return or_(and_(column.isnot(None), after), column.is_(None))
+
+
+# Task columns selectable with ?fields=; "id" is always returned
+TASK_FIELDS = ("id", "title", "description", "category", "priority", "deadline", "status", "owner_id", "created_at",
+               "updated_at", "subtask_total", "subtask_completed")
+# Task columns without the subtask counters
+TASK_BASE_FIELDS = TASK_FIELDS[:-2]
+# What to return alongside each task: full subtasks, only their counts, or nothing
+TASK_INCLUDES = ("subtasks", "subtask_counts", "none")
+
+# Live subtask counts, used to (re)compute the denormalized counters
+SUBTASK_COUNT = select(func.count(models.Subtask.id)).where(
+    models.Subtask.task_id == models.Task.id).correlate(models.Task).scalar_subquery()
+SUBTASKS_COMPLETED = select(func.count(models.Subtask.id)).where(
+    models.Subtask.task_id == models.Task.id, models.Subtask.is_completed.is_(True)
+).correlate(models.Task).scalar_subquery()
+
+
+def parse_task_fields(fields: str = None):
+    """
+    Parse a comma-separated sparse fieldset such as "title,status".
+
+    Returns:
+        Tuple of field names starting with "id", or None for every column
+
+    Raises:
+        ValueError: If a field is not in TASK_FIELDS
+    """
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in TASK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown task field(s): {', '.join(unknown)}")
+    return tuple(dict.fromkeys(["id", *names]))
+
+
+def _is_full_task_read(include: str, fields) -> bool:
+    return include == "subtasks" and fields is None
+
+
+def _task_select(include: str, fields, extra_fields=()):
+    # Full reads load Task models with their subtasks; anything lighter
+    # selects just the needed columns and returns dicts.
+    if _is_full_task_read(include, fields):
+        return select(models.Task).options(selectinload(models.Task.subtasks))
+    names = [*(fields or TASK_BASE_FIELDS), *extra_fields]
+    if include == "subtask_counts":
+        names += ["subtask_total", "subtask_completed"]
+    return select(*[getattr(models.Task, name) for name in dict.fromkeys(names)])
+
+
+async def _task_dicts(db: AsyncSession, query, include: str):
+    rows = [row._asdict() for row in (await db.execute(query)).all()]
+    if include == "subtasks" and rows:
+        result = await db.execute(
+            select(models.Subtask).filter(models.Subtask.task_id.in_([row["id"] for row in rows])))
+        by_task = {}
+        for subtask in result.scalars().all():
+            by_task.setdefault(subtask.task_id, []).append(subtask)
+        for row in rows:
+            row["subtasks"] = by_task.get(row["id"], [])
+    return rows
+
+
+def _apply_task_filters(query, filters: schemas.TaskFilters):
+    if filters.status:
+        query = query.filter(models.Task.status.in_(filters.status))
+    if filters.priority:
+        query = query.filter(models.Task.priority.in_(filters.priority))
+    if filters.category:
+        query = query.filter(models.Task.category.in_(filters.category))
+    if filters.deadline_after is not None:
+        query = query.filter(models.Task.deadline >= filters.deadline_after)
+    if filters.deadline_before is not None:
+        query = query.filter(models.Task.deadline < filters.deadline_before)
+    return query
 
-async def get_tasks(db: AsyncSession, skip: int = 0, limit: int = 100, user_id: str = None):
+
+async def get_tasks(db: AsyncSession, skip: int = 0, limit: int = 100, user_id: str = None, cursor: str = None,
+                    filters: schemas.TaskFilters = None, sort: str = DEFAULT_TASK_SORT,
+                    include: str = "subtasks", fields: tuple = None):
     """
-    Retrieve a list of tasks for a specific user.
+    Retrieve a filtered, sorted list of tasks for a specific user.
     
     Args:
         db: Database session
-        skip: Number of records to skip
+        skip: Number of records to skip (ignored when a cursor is given)
         limit: Maximum number of records to return
         user_id: ID of the user
+        cursor: Keyset cursor from encode_task_cursor
+        filters: Optional status/priority/category/deadline filters
+        sort: Sort spec, a field from TASK_SORT_FIELDS with optional "-" prefix
+        include: One of TASK_INCLUDES
+        fields: Columns from parse_task_fields, or None for all
+        
+    Returns:
+        List of Task models for full reads (all fields with subtasks),
+        otherwise list of dicts holding the requested fields and the sort field
+    """
+    field, descending = parse_task_sort(sort)
+    column, nullable = TASK_SORT_FIELDS[field]
+    order = (column.desc(), models.Task.id.desc()) if descending else (column.asc(), models.Task.id.asc())
+    if nullable:
+        order = (column.is_(None),) + order
+
+    query = _task_select(include, fields, extra_fields=(field,)).filter(
+        models.Task.owner_id == user_id).order_by(*order)
+    if filters is not None:
+        query = _apply_task_filters(query, filters)
+    if cursor:
+        value, task_id = decode_task_cursor(cursor, sort)
+        query = query.filter(_keyset_after(column, nullable, descending, value, task_id))
+    elif skip:
+        query = query.offset(skip)
+    if not _is_full_task_read(include, fields):
+        return await _task_dicts(db, query.limit(limit), include)
+    result = await db.execute(query.limit(limit))
+    return result.scalars().all()
+
+
+async def get_task_page(db: AsyncSession, user_id: str, limit: int = 100, cursor: str = None, skip: int = 0,
+                        filters: schemas.TaskFilters = None, sort: str = DEFAULT_TASK_SORT,
+                        include: str = "subtasks", fields: tuple = None):
+    """
+    Retrieve one page of tasks plus the cursor for the next page.
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        limit: Page size
+        cursor: Cursor returned with the previous page
+        skip: Legacy offset, only used without a cursor
+        filters: Optional task filters
+        sort: Sort spec
+        include: One of TASK_INCLUDES
+        fields: Columns from parse_task_fields, or None for all
+        
+    Returns:
+        Tuple of (list of Task models or dicts, next cursor or None)
+    """
+    tasks = await get_tasks(db, skip=skip, limit=limit + 1, user_id=user_id, cursor=cursor,
+                            filters=filters, sort=sort, include=include, fields=fields)
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_task_cursor(tasks[-1], sort)
+    if fields is not None:
+        # The sort field was only loaded for the cursor
+        dropped = set(TASK_FIELDS) - set(fields)
+        if include == "subtask_counts":
+            dropped -= {"subtask_total", "subtask_completed"}
+        tasks = [{key: value for key, value in task.items() if key not in dropped} for task in tasks]
+    return tasks, next_cursor
+
+
+async def search_tasks(db: AsyncSession, user_id: str, q: str, skip: int = 0, limit: int = 20):
+    """
+    Full-text search over a user's task titles and descriptions.
+    
+    Uses the tsvector column on PostgreSQL and the FTS5 table on SQLite
+    (see services/task_search.py).
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        q: Search text
+        skip: Number of results to skip
+        limit: Maximum number of results to return
+        
+    Returns:
+        List of task dicts (without subtasks) with a "rank" key, best match first
+    """
+    query, rank = task_search.apply_search(_task_select("subtask_counts", None), db.bind.dialect.name, q)
+    if query is None:
+        return []
+    query = query.filter(models.Task.owner_id == user_id).order_by(rank.desc(), models.Task.id)
+    return await _task_dicts(db, query.offset(skip).limit(limit), "none")
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes for timezone-aware columns
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def encode_sync_token(updated_at: datetime, task_id: str = "") -> str:
+    raw = json.dumps([_as_utc(updated_at).isoformat(), task_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_sync_token(token: str):
+    """
+    Decode a token produced by encode_sync_token.
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        updated_at, task_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return _as_utc(datetime.fromisoformat(updated_at)), str(task_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid sync token") from e
+
+
+async def get_task_changes(db: AsyncSession, user_id: str, since: str = None, limit: int = 500, now: datetime = None):
+    """
+    Tasks created, modified or deleted since a sync token.
+    
+    Changed tasks are read in (updated_at, id) order from
+    ix_tasks_owner_updated_id, so the cost follows the number of changes,
+    not the number of tasks. Once caught up, the returned token points
+    SYNC_OVERLAP_SECONDS into the past, so a few rows may be sent twice but
+    rows from transactions that committed late are not skipped.
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        since: Token from a previous call, or None for a full sync
+        limit: Maximum number of changed tasks per call
+        now: Current time (defaults to UTC now)
+        
+    Returns:
+        TaskChanges schema
+        
+    Raises:
+        ValueError: If the token is malformed
+        SyncTokenExpired: If the token is older than the tombstone retention
+    """
+    now = now or datetime.now(timezone.utc)
+    since_position = decode_sync_token(since) if since else None
+    if since_position and since_position[0] < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        raise SyncTokenExpired()
+
+    query = select(models.Task).options(selectinload(models.Task.subtasks)).filter(
+        models.Task.owner_id == user_id
+    ).order_by(models.Task.updated_at, models.Task.id)
+    if since_position:
+        query = query.filter(tuple_(models.Task.updated_at, models.Task.id) > tuple_(*since_position))
+    tasks = (await db.execute(query.limit(limit + 1))).scalars().all()
+    has_more = len(tasks) > limit
+    tasks = tasks[:limit]
+
+    deleted = []
+    if since_position:
+        result = await db.execute(
+            select(models.TaskTombstone.task_id).filter(
+                models.TaskTombstone.owner_id == user_id,
+                models.TaskTombstone.deleted_at >= since_position[0],
+            ).order_by(models.TaskTombstone.deleted_at)
+        )
+        deleted = result.scalars().all()
+
+    position = (_as_utc(tasks[-1].updated_at), tasks[-1].id) if tasks else since_position
+    if not has_more:
+        # Caught up: step back into the overlap window, but never behind `since`
+        overlap_start = (now - timedelta(seconds=SYNC_OVERLAP_SECONDS), "")
+        position = min(position, overlap_start) if position else overlap_start
+        if since_position:
+            position = max(position, since_position)
+    return schemas.TaskChanges(
+        changed=tasks,
+        deleted=deleted,
+        next_token=encode_sync_token(*position),
+        has_more=has_more,
+    )
+
+
+async def purge_tombstones(db: AsyncSession, now: datetime = None):
+    """
+    Delete tombstones past TOMBSTONE_RETENTION_DAYS.
+    
+    Returns:
+        Number of tombstones removed
+    """
+    now = now or datetime.now(timezone.utc)
+    result = await db.execute(
+        delete(models.TaskTombstone)
+        .where(models.TaskTombstone.deleted_at < now - timedelta(days=TOMBSTONE_RETENTION_DAYS))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def get_task_stats(db: AsyncSession, user_id: str, now: datetime = None):
+    """
+    Compute task statistics for a user in a single aggregate query.
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        now: Reference time for overdue checks (defaults to current UTC time)
+        
+    Returns:
+        AIStats schema
+    """
+    now = now or datetime.now(timezone.utc)
+    is_completed = models.Task.status == "completed"
+    not_completed = or_(models.Task.status.is_(None), models.Task.status != "completed")
+    query = select(
+        func.count(),
+        func.count().filter(is_completed),
+        func.count().filter(and_(not_completed, models.Task.deadline < now)),
+        func.count().filter(and_(not_completed, models.Task.priority == "high")),
+    ).select_from(models.Task).filter(models.Task.owner_id == user_id)
+    total, completed, overdue, high_priority = (await db.execute(query)).one()
+    return schemas.AIStats(
+        total=total,
+        completed=completed,
+        pending=total - completed,
+        overdue=overdue,
+        highPriority=high_priority,
+        completionRate=int((completed / total * 100) if total > 0 else 0),
+    )
+
+
+PRIORITY_RANK = case(
+    (models.Task.priority == "high", 0),
+    (models.Task.priority == "medium", 1),
+    (models.Task.priority == "low", 2),
+    else_=3,
+)
+
+
+async def get_pending_tasks(db: AsyncSession, user_id: str, limit: int = 20):
+    """
+    Retrieve the most urgent unfinished tasks for a user.
+    
+    Tasks are ordered by deadline (no deadline last), then priority.
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        limit: Maximum number of records to return
         
     Returns:
         List of Task models
     """
     query = select(models.Task).options(selectinload(models.Task.subtasks)).filter(
-        models.Task.owner_id == user_id).offset(skip).limit(limit)
+        models.Task.owner_id == user_id,
+        or_(models.Task.status.is_(None), models.Task.status != "completed"),
+    ).order_by(
+        models.Task.deadline.is_(None), models.Task.deadline, PRIORITY_RANK, models.Task.id
+    ).limit(limit)
     result = await db.execute(query)
     return result.scalars().all()
 
 
+async def refresh_subtask_counts(db: AsyncSession, task_id: str):
+    """
+    Recompute a task's subtask_total/subtask_completed in the caller's transaction.
+    
+    Counting instead of applying +1/-1 deltas means any earlier drift is
+    corrected by the next subtask write; it is an index-only count of one
+    task's subtasks. The UPDATE also touches the task's updated_at, which
+    is how subtask changes reach delta sync.
+    
+    The caller must have locked the task row in the same transaction
+    before writing the subtask (see routers.subtasks.owned_task_ids).
+    Under READ COMMITTED the count runs on the statement's snapshot, so
+    without that lock a concurrent writer's uncommitted subtask is left
+    out and the counters are wrong once both commit. SQLite serialises
+    writers and needs no lock.
+    """
+    await db.execute(
+        update(models.Task)
+        .where(models.Task.id == task_id)
+        .values(subtask_total=SUBTASK_COUNT, subtask_completed=SUBTASKS_COMPLETED)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def repair_subtask_counts(db: AsyncSession, batch_size: int = 1000):
+    """
+    Recompute drifted subtask counters across all tasks.
+    
+    Walks tasks in primary-key batches, one short transaction each, and
+    only rewrites rows whose counters are wrong. Owners of repaired tasks
+    get their task revision bumped so cached ETags are invalidated.
+    
+    Args:
+        db: Database session
+        batch_size: Tasks checked per transaction
+        
+    Returns:
+        Number of tasks repaired
+    """
+    repaired = 0
+    last_id = None
+    while True:
+        query = select(models.Task.id).order_by(models.Task.id).limit(batch_size)
+        if last_id is not None:
+            query = query.filter(models.Task.id > last_id)
+        task_ids = (await db.execute(query)).scalars().all()
+        if not task_ids:
+            return repaired
+        last_id = task_ids[-1]
+        result = await db.execute(
+            update(models.Task)
+            .where(
+                models.Task.id.in_(task_ids),
+                or_(models.Task.subtask_total != SUBTASK_COUNT, models.Task.subtask_completed != SUBTASKS_COMPLETED),
+            )
+            .values(subtask_total=SUBTASK_COUNT, subtask_completed=SUBTASKS_COMPLETED)
+            .returning(models.Task.id, models.Task.owner_id)
+            .execution_options(synchronize_session=False)
+        )
+        repaired_by_owner = {}
+        for task_id, owner_id in result.all():
+            repaired_by_owner.setdefault(owner_id, []).append(task_id)
+        for owner_id in repaired_by_owner:
+            await bump_task_revision(db, owner_id)
+        for owner_id, repaired_ids in repaired_by_owner.items():
+            await change_feed.publish_many(owner_id, "tasks.updated", repaired_ids, session=db)
+        await db.commit()
+        repaired += sum(len(ids) for ids in repaired_by_owner.values())
+
+
+def _detach(db: AsyncSession, task: models.Task):
+    # Returned rows are handed to the response after commit; detach them so
+    # the commit does not expire attributes that would then lazy-load.
+    for subtask in task.subtasks:
+        db.expunge(subtask)
+    db.expunge(task)
+
+
 async def create_task(db: AsyncSession, task: schemas.TaskCreate, user_id: str):
     """
-    Create a new task for a user.
+    Create a new task for a user with a single INSERT ... RETURNING.
     
     Args:
         db: Database session
@@ -89,39 +628,305 @@ async def create_task(db: AsyncSession, task: schemas.TaskCreate, user_id: str):
     Returns:
         Created Task model
     """
-    db_task = models.Task(**task.dict(), owner_id=user_id)
-    db.add(db_task)
+    result = await db.execute(
+        insert(models.Task).values(**task.model_dump(), owner_id=user_id).returning(models.Task)
+    )
+    db_task = result.scalars().one()
+    # A new task has no subtasks; set it so serialization never lazy-loads
+    set_committed_value(db_task, "subtasks", [])
+    await bump_task_revision(db, user_id)
+    _detach(db, db_task)
+    await change_feed.publish(user_id, "task.created", db, task_id=db_task.id)
     await db.commit()
-    await db.refresh(db_task)
-    # Eager load subtasks for the returned object
-    result = await db.execute(select(models.Task).options(selectinload(models.Task.subtasks)).filter(models.Task.id == db_task.id))
-    return result.scalars().first()
+    return db_task
 
 
-async def get_task(db: AsyncSession, task_id: str, user_id: str):
-    result = await db.execute(select(models.Task).options(selectinload(models.Task.subtasks)).filter(models.Task.id == task_id, models.Task.owner_id == user_id))
+async def get_task(db: AsyncSession, task_id: str, user_id: str, include: str = "subtasks", fields: tuple = None):
+    query = _task_select(include, fields).filter(models.Task.id == task_id, models.Task.owner_id == user_id)
+    if not _is_full_task_read(include, fields):
+        tasks = await _task_dicts(db, query, include)
+        return tasks[0] if tasks else None
+    result = await db.execute(query)
     return result.scalars().first()
 
 
 async def update_task(db: AsyncSession, task_id: str, task: schemas.TaskUpdate, user_id: str):
-    # Check if task exists and belongs to user
-    db_task = await get_task(db, task_id, user_id)
-    if not db_task:
-        return None
+    """
+    Update a task; the ownership check is part of the UPDATE itself.
+    
+    Issues UPDATE ... WHERE id = ... AND owner_id = ... RETURNING plus one
+    SELECT for the task's subtasks.
+    
+    Returns:
+        Updated Task model, or None if the task does not exist for this user
+    """
+    update_data = task.model_dump(exclude_unset=True)
+    if not update_data:
+        return await get_task(db, task_id, user_id)
 
-    update_data = task.dict(exclude_unset=True)
-    await db.execute(update(models.Task).where(models.Task.id == task_id).values(**update_data))
+    result = await db.execute(
+        update(models.Task)
+        .where(models.Task.id == task_id, models.Task.owner_id == user_id)
+        .values(**update_data)
+        .returning(models.Task)
+        .execution_options(synchronize_session=False)
+    )
+    db_task = result.scalars().first()
+    if db_task is None:
+        return None
+    subtasks = await db.execute(select(models.Subtask).filter(models.Subtask.task_id == task_id))
+    set_committed_value(db_task, "subtasks", list(subtasks.scalars().all()))
+    await bump_task_revision(db, user_id)
+    _detach(db, db_task)
+    await change_feed.publish(user_id, "task.updated", db, task_id=task_id)
     await db.commit()
-    # Refresh with eager load
-    result = await db.execute(select(models.Task).options(selectinload(models.Task.subtasks)).filter(models.Task.id == task_id))
-    return result.scalars().first()
+    return db_task
 
 
 async def delete_task(db: AsyncSession, task_id: str, user_id: str):
-    db_task = await get_task(db, task_id, user_id)
-    if not db_task:
+    """
+    Delete a task and its subtasks with two DELETE ... RETURNING statements,
+    leaving a tombstone for delta sync.
+    
+    Returns:
+        Deleted Task model (with its subtasks), or None if not found
+    """
+    owned = select(models.Task.id).filter(models.Task.id == task_id, models.Task.owner_id == user_id)
+    subtasks = await db.execute(
+        delete(models.Subtask)
+        .where(models.Subtask.task_id.in_(owned))
+        .returning(models.Subtask)
+        .execution_options(synchronize_session=False)
+    )
+    deleted_subtasks = list(subtasks.scalars().all())
+    result = await db.execute(
+        delete(models.Task)
+        .where(models.Task.id == task_id, models.Task.owner_id == user_id)
+        .returning(models.Task)
+        .execution_options(synchronize_session=False)
+    )
+    db_task = result.scalars().first()
+    if db_task is None:
+        await db.rollback()
         return None
-
-    await db.delete(db_task)
+    await db.execute(insert(models.TaskTombstone).values(task_id=task_id, owner_id=user_id))
+    set_committed_value(db_task, "subtasks", deleted_subtasks)
+    await bump_task_revision(db, user_id)
+    _detach(db, db_task)
+    await change_feed.publish(user_id, "task.deleted", db, task_id=task_id)
     await db.commit()
     return db_task
+
+
+async def bulk_create_tasks(db: AsyncSession, tasks: list, user_id: str):
+    """
+    Insert many tasks for a user with one multi-row INSERT.
+    
+    Args:
+        db: Database session
+        tasks: List of TaskCreate schemas
+        user_id: ID of the owner
+        
+    Returns:
+        List of new task IDs, in input order
+    """
+    rows = [dict(task.model_dump(), id=str(uuid.uuid4()), owner_id=user_id) for task in tasks]
+    if rows:
+        await db.execute(insert(models.Task), rows)
+        await bump_task_revision(db, user_id)
+        await change_feed.publish_many(user_id, "tasks.created", [row["id"] for row in rows], session=db)
+        await db.commit()
+    return [row["id"] for row in rows]
+
+
+async def bulk_update_tasks(db: AsyncSession, items: list, user_id: str):
+    """
+    Apply many partial updates in one transaction.
+    
+    Items that set the same values are grouped into a single
+    UPDATE ... WHERE id IN (...) AND owner_id = ... statement.
+    
+    Args:
+        db: Database session
+        items: List of TaskBulkUpdateItem schemas with unique IDs
+        user_id: ID of the owner
+        
+    Returns:
+        Set of IDs that were updated (missing or foreign IDs are absent)
+    """
+    groups = {}
+    for item in items:
+        values = item.model_dump(exclude_unset=True, exclude={"id"})
+        groups.setdefault(tuple(sorted(values.items())), []).append(item.id)
+
+    updated = set()
+    for values, task_ids in groups.items():
+        result = await db.execute(
+            update(models.Task)
+            .where(models.Task.id.in_(task_ids), models.Task.owner_id == user_id)
+            .values(**dict(values))
+            .returning(models.Task.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated.update(result.scalars().all())
+    if updated:
+        await bump_task_revision(db, user_id)
+    await change_feed.publish_many(user_id, "tasks.updated", updated, session=db)
+    await db.commit()
+    return updated
+
+
+async def bulk_delete_tasks(db: AsyncSession, task_ids: list, user_id: str):
+    """
+    Delete many tasks and their subtasks in one transaction.
+    
+    Args:
+        db: Database session
+        task_ids: IDs of the tasks to delete
+        user_id: ID of the owner
+        
+    Returns:
+        Set of IDs that were deleted
+    """
+    owned = select(models.Task.id).filter(models.Task.id.in_(task_ids), models.Task.owner_id == user_id)
+    await db.execute(
+        delete(models.Subtask).where(models.Subtask.task_id.in_(owned))
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(
+        delete(models.Task)
+        .where(models.Task.id.in_(task_ids), models.Task.owner_id == user_id)
+        .returning(models.Task.id)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = set(result.scalars().all())
+    if deleted:
+        await db.execute(insert(models.TaskTombstone),
+                         [{"task_id": task_id, "owner_id": user_id} for task_id in deleted])
+        await bump_task_revision(db, user_id)
+    await change_feed.publish_many(user_id, "tasks.deleted", deleted, session=db)
+    await db.commit()
+    return deleted
+
+
+EXPORT_TASK_FIELDS = ("id", "title", "description", "category", "priority", "status", "deadline",
+                      "created_at", "updated_at")
+EXPORT_SUBTASK_FIELDS = ("id", "title", "is_completed", "updated_at")
+
+
+async def stream_task_export(db: AsyncSession, user_id: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Yield a user's tasks, oldest first, each as a dict with a "subtasks" list.
+    
+    Tasks and subtasks come from one outer join read through a server-side
+    cursor, batch_size rows per fetch. Rows are plain tuples, never ORM
+    objects, so memory stays flat however many tasks the user has.
+    
+    Args:
+        db: Database session
+        user_id: ID of the owner
+        batch_size: Rows fetched per round trip
+    """
+    subtask_columns = [getattr(models.Subtask, name).label(f"subtask_{name}") for name in EXPORT_SUBTASK_FIELDS]
+    query = (
+        select(*[getattr(models.Task, name) for name in EXPORT_TASK_FIELDS], *subtask_columns)
+        .outerjoin(models.Subtask, models.Subtask.task_id == models.Task.id)
+        .filter(models.Task.owner_id == user_id)
+        .order_by(models.Task.created_at, models.Task.id, models.Subtask.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(query)
+    task = None
+    async for row in result:
+        if task is None or task["id"] != row.id:
+            if task is not None:
+                yield task
+            task = {name: getattr(row, name) for name in EXPORT_TASK_FIELDS}
+            task["subtasks"] = []
+        if row.subtask_id is not None:
+            task["subtasks"].append({name: getattr(row, f"subtask_{name}") for name in EXPORT_SUBTASK_FIELDS})
+    if task is not None:
+        yield task
+
+
+async def import_tasks(db: AsyncSession, user_id: str, records, batch_size: int = None):
+    """
+    Insert tasks and their subtasks from an async stream of parsed records.
+    
+    Every batch_size valid tasks are written in one transaction: two
+    multi-row INSERTs, with the subtask counters filled in and the task
+    revision bumped. Progress is published on the change feed after each
+    batch. Invalid records are skipped and reported. Only one batch is held
+    in memory at a time.
+    
+    Args:
+        db: Database session
+        user_id: ID of the owner
+        records: Async iterable of (line number, dict or ValueError),
+            as produced by services.task_transfer
+        batch_size: Tasks per transaction (defaults to IMPORT_BATCH_SIZE)
+        
+    Returns:
+        TaskImportResult schema; `aborted` is set if the stream could not
+        be read to the end
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    result = schemas.TaskImportResult(imported=0, subtasks=0, failed=0, batches=0, errors=[])
+    task_rows, subtask_rows = [], []
+
+    def fail(line: int, error: str):
+        result.failed += 1
+        if len(result.errors) < IMPORT_MAX_ERRORS:
+            result.errors.append(schemas.TaskImportError(line=line, error=error))
+
+    async def flush():
+        await db.execute(insert(models.Task), task_rows)
+        if subtask_rows:
+            await db.execute(insert(models.Subtask), subtask_rows)
+        await bump_task_revision(db, user_id)
+        await change_feed.publish(user_id, "tasks.import_progress", db,
+                                  imported=result.imported + len(task_rows), failed=result.failed)
+        await db.commit()
+        result.imported += len(task_rows)
+        result.subtasks += len(subtask_rows)
+        result.batches += 1
+        task_rows.clear()
+        subtask_rows.clear()
+
+    try:
+        async for line, record in records:
+            if isinstance(record, Exception):
+                fail(line, str(record))
+                continue
+            try:
+                item = schemas.TaskImport.model_validate(record)
+            except ValueError as e:
+                fail(line, str(e))
+                continue
+            now = datetime.now(timezone.utc)
+            task_id = str(uuid.uuid4())
+            task_rows.append(dict(
+                item.model_dump(exclude={"created_at", "subtasks"}),
+                id=task_id, owner_id=user_id, status=item.status or "pending",
+                created_at=item.created_at or now, updated_at=now,
+                subtask_total=len(item.subtasks),
+                subtask_completed=sum(1 for subtask in item.subtasks if subtask.is_completed),
+            ))
+            subtask_rows.extend(
+                {"id": str(uuid.uuid4()), "task_id": task_id, "title": subtask.title,
+                 "is_completed": bool(subtask.is_completed), "updated_at": now}
+                for subtask in item.subtasks
+            )
+            if len(task_rows) >= batch_size:
+                await flush()
+    except ValueError as e:
+        # The stream itself is unusable (bad header, oversized record);
+        # keep what was parsed before it and report where it stopped
+        result.aborted = str(e)
+    if task_rows:
+        await flush()
+    if result.imported:
+        # One event for the whole import; clients refetch rather than replay every ID
+        await change_feed.publish(user_id, "resync", db, reason="tasks.imported", count=result.imported)
+        await db.commit()
+    return result
@@ -0,0 +1,203 @@
+import asyncio
+import os
+import random
+import time
+from typing import TYPE_CHECKING
+from services.metrics import gemini_request_duration
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Point at scripts/gemini_stub.py for local load tests
+GEMINI_API_BASE_URL = os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 10))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 2))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", 0.5))
+GEMINI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("GEMINI_BREAKER_FAILURE_THRESHOLD", 5))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", 30))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# httpx is imported when the client starts, keeping it off the worker start-up path
+if TYPE_CHECKING:
+    import httpx
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail fast for `reset_seconds`; then a single trial call is let
+    through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = GEMINI_BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = GEMINI_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def abandon_trial(self):
+        # A cancelled trial says nothing about upstream; the next call may try again
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class GeminiClient:
+    """
+    App-lifetime Gemini client.
+
+    Reuses one keep-alive connection pool, caps concurrent upstream calls,
+    retries transient failures with jittered exponential backoff and sits
+    behind a circuit breaker.
+    """
+
+    def __init__(self, api_key: str = GEMINI_API_KEY, model: str = GEMINI_MODEL,
+                 base_url: str = GEMINI_API_BASE_URL, max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 timeout: float = GEMINI_TIMEOUT_SECONDS, max_retries: int = GEMINI_MAX_RETRIES,
+                 retry_base_delay: float = GEMINI_RETRY_BASE_DELAY, breaker: CircuitBreaker = None,
+                 transport: "httpx.AsyncBaseTransport" = None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.transport = transport
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self._http = None
+        self._semaphore = None
+        self._loop = None
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.base_url}/v1beta/models/{self.model}:generateContent"
+
+    def _ensure_started(self):
+        # The pool and semaphore belong to one event loop; rebuild them if
+        # we are now running on another (e.g. a fresh loop per test).
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop:
+            import httpx
+
+            self._http = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+
+    async def start(self):
+        self._ensure_started()
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def generate(self, prompt: str) -> str:
+        """
+        Send a prompt and return the text of the first candidate.
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+            httpx.HTTPError: If every attempt failed
+        """
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        trial = self.breaker.state == "half_open"
+        self._ensure_started()
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        self.calls += 1
+        started = time.perf_counter()
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    data = await self._post_with_retries(payload)
+                finally:
+                    self.in_flight -= 1
+            text = data["candidates"][0]["content"]["parts"][0]["text"]
+        except Exception:
+            self.failures += 1
+            self.breaker.record_failure()
+            gemini_request_duration.observe(time.perf_counter() - started, "error")
+            raise
+        except BaseException:
+            # Cancelled (client disconnect, shutdown): free the half-open trial slot
+            if trial:
+                self.breaker.abandon_trial()
+            raise
+        self.breaker.record_success()
+        gemini_request_duration.observe(time.perf_counter() - started, "success")
+        return text
+
+    async def _post_with_retries(self, payload: dict) -> dict:
+        import httpx
+
+        attempt = 0
+        while True:
+            try:
+                # The key goes in a header: httpx errors quote the URL, and they get logged
+                response = await self._http.post(self.api_url, headers={"x-goog-api-key": self.api_key},
+                                                 json=payload)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+            except (httpx.TransportError, httpx.TimeoutException):
+                if attempt >= self.max_retries:
+                    raise
+            # Full jitter: sleep a random slice of the exponential backoff window
+            await asyncio.sleep(random.uniform(0, self.retry_base_delay * (2 ** attempt)))
+            attempt += 1
+
+    def stats(self):
+        return {
+            "breaker_state": self.breaker.state,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+        }
+
+
+gemini_client = GeminiClient()
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from services.summary_cache import MemoryCacheBackend, SQLiteCacheBackend
+
+SUMMARY_JOB_BACKEND = os.getenv("SUMMARY_JOB_BACKEND", "memory")  # memory or sqlite
+SUMMARY_JOB_PATH = os.getenv("SUMMARY_JOB_PATH", "./summary_jobs.db")
+SUMMARY_JOB_WORKERS = int(os.getenv("SUMMARY_JOB_WORKERS", 4))
+SUMMARY_JOB_MAX_PENDING = int(os.getenv("SUMMARY_JOB_MAX_PENDING", 100))
+SUMMARY_JOB_TTL_SECONDS = int(os.getenv("SUMMARY_JOB_TTL_SECONDS", 900))
+SUMMARY_JOB_MAX_ENTRIES = int(os.getenv("SUMMARY_JOB_MAX_ENTRIES", 10000))
+# Workers re-stamp the jobs they hold this often; a queued or running job
+# not stamped for SUMMARY_JOB_STALE_SECONDS belonged to a worker that died
+SUMMARY_JOB_HEARTBEAT_SECONDS = float(os.getenv("SUMMARY_JOB_HEARTBEAT_SECONDS", 10))
+SUMMARY_JOB_STALE_SECONDS = float(os.getenv("SUMMARY_JOB_STALE_SECONDS", 30))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+logger = logging.getLogger("taskflow.jobs")
+
+
+class JobQueueFull(Exception):
+    """Raised when no more jobs may be queued."""
+
+
+class JobConflict(Exception):
+    """Raised when another worker process changed the owner's active job mid-submit; retry."""
+
+
+class JobQueue:
+    """
+    Bounded in-process worker pool whose job records live in a TTL store.
+
+    Each owner has at most one active job: submitting while one is queued
+    or running returns the existing job instead of starting another.
+    Submits are serialised per owner in this process, and the owner's
+    active slot is claimed with an atomic insert in the store, so workers
+    sharing the SQLite store cannot both start one. With the SQLite store,
+    any worker process on the host can also answer polls.
+
+    Queued and running jobs carry a heartbeat refreshed by the worker that
+    holds them. If that worker dies, its jobs go stale: polls report them
+    failed and the owner's next submit starts a new job.
+    """
+
+    def __init__(self, store, workers: int = SUMMARY_JOB_WORKERS, max_pending: int = SUMMARY_JOB_MAX_PENDING,
+                 ttl_seconds: int = SUMMARY_JOB_TTL_SECONDS,
+                 heartbeat_seconds: float = SUMMARY_JOB_HEARTBEAT_SECONDS,
+                 stale_seconds: float = SUMMARY_JOB_STALE_SECONDS):
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.ttl_seconds = ttl_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+        self._queue = None
+        self._tasks = []
+        self._loop = None
+        self._submit_locks = {}  # owner_id -> [lock, waiting submits]
+        self._held = {}  # job_id -> job, for jobs queued or running here
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(loop.create_task(self._heartbeat()))
+            self._held = {}
+            self._loop = loop
+
+    async def start(self):
+        self._ensure_started()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def _save(self, job: dict):
+        await self.store.set(f"job:{job['id']}", job, self.ttl_seconds)
+
+    def is_active(self, job: dict) -> bool:
+        return (job["status"] in ACTIVE_STATUSES
+                and time.time() - job.get("heartbeat_at", job["created_at"]) < self.stale_seconds)
+
+    async def get(self, job_id: str):
+        job = await self.store.get(f"job:{job_id}")
+        if job is not None and job["status"] in ACTIVE_STATUSES and not self.is_active(job):
+            return dict(job, status="failed", error="The worker running this job stopped")
+        return job
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            for job in list(self._held.values()):
+                job["heartbeat_at"] = time.time()
+                try:
+                    await self._save(job)
+                except Exception:
+                    logger.exception("Failed to refresh summary job %s", job["id"])
+
+    async def get_active(self, owner_id: str):
+        """
+        Return the owner's queued or running job, if any.
+
+        Called on submission, so a hit is counted as a deduplicated submit.
+        """
+        active_id = await self.store.get(f"active:{owner_id}")
+        if active_id is None:
+            return None
+        job = await self.get(active_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            return None
+        self.deduplicated += 1
+        return job
+
+    @asynccontextmanager
+    async def _owner_lock(self, owner_id: str):
+        entry = self._submit_locks.setdefault(owner_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._submit_locks[owner_id]
+
+    async def _claim(self, owner_id: str, job_id: str) -> bool:
+        key = f"active:{owner_id}"
+        if await self.store.add(key, job_id, self.ttl_seconds):
+            return True
+        # A slot left by a finished, evicted or stale job is taken over, but
+        # only if no other worker has replaced it in the meantime
+        current = await self.store.get(key)
+        if current is not None:
+            job = await self.get(current)
+            if job is not None and job["status"] in ACTIVE_STATUSES:
+                return False
+            await self.store.delete(key, current)
+        return await self.store.add(key, job_id, self.ttl_seconds)
+
+    async def submit(self, owner_id: str, fn):
+        """
+        Queue `fn()` for an owner, or return their job already in progress.
+
+        Args:
+            owner_id: ID of the user the job belongs to
+            fn: Zero-argument coroutine function returning a JSON-serializable result
+
+        Returns:
+            Tuple of (job record, whether a new job was created)
+
+        Raises:
+            JobQueueFull: If max_pending jobs are already waiting
+            JobConflict: If another worker process took the owner's slot
+                and its job is already over
+        """
+        self._ensure_started()
+        async with self._owner_lock(owner_id):
+            job = await self.get_active(owner_id)
+            if job is not None:
+                return job, False
+
+            if self._queue.full():
+                raise JobQueueFull()
+            now = time.time()
+            job = {
+                "id": str(uuid.uuid4()),
+                "owner_id": owner_id,
+                "status": "queued",
+                "created_at": now,
+                "heartbeat_at": now,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            # Saved before claiming, so a claim never points at a missing job
+            await self._save(job)
+            if not await self._claim(owner_id, job["id"]):
+                # Another worker process claimed the slot first; if its job
+                # has already finished, the caller is told to retry
+                await self.store.delete(f"job:{job['id']}")
+                active = await self.get_active(owner_id)
+                if active is not None:
+                    return active, False
+                raise JobConflict()
+            self._held[job["id"]] = job
+            self._queue.put_nowait((job, fn))
+            self.submitted += 1
+            return job, True
+
+    async def _worker(self):
+        while True:
+            job, fn = await self._queue.get()
+            try:
+                job["status"] = "running"
+                await self._save(job)
+                try:
+                    job["result"] = await fn()
+                    job["status"] = "succeeded"
+                    self.completed += 1
+                except Exception as e:
+                    logger.exception("Summary job %s failed", job["id"])
+                    job["status"] = "failed"
+                    job["error"] = str(e)
+                    self.failed += 1
+                job["finished_at"] = time.time()
+                await self._save(job)
+                await self.store.delete(f"active:{job['owner_id']}", job["id"])
+            finally:
+                self._held.pop(job["id"], None)
+                self._queue.task_done()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": self.workers if self._tasks else 0,
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+def create_store(kind: str = SUMMARY_JOB_BACKEND):
+    if kind == "sqlite":
+        return SQLiteCacheBackend(SUMMARY_JOB_PATH, max_entries=SUMMARY_JOB_MAX_ENTRIES)
+    if kind == "memory":
+        return MemoryCacheBackend(max_entries=SUMMARY_JOB_MAX_ENTRIES)
+    raise ValueError(f"Unknown summary job backend: {kind}")
+
+
+summary_jobs = JobQueue(create_store())
@@ -0,0 +1,338 @@
+import asyncio
+import hashlib
+import ipaddress
+import math
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from starlette.responses import JSONResponse
+from config import env_bool
+from services.auth_cache import principal_cache
+
+RATE_LIMIT_ENABLED = env_bool("RATE_LIMIT_ENABLED", True)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory or sqlite (shared by local workers)
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", "./rate_limit.db")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# Token buckets: burst size, and tokens regained per second
+RATE_LIMIT_IP_CAPACITY = float(os.getenv("RATE_LIMIT_IP_CAPACITY", 30))
+RATE_LIMIT_IP_REFILL_PER_SECOND = float(os.getenv("RATE_LIMIT_IP_REFILL_PER_SECOND", 0.5))
+RATE_LIMIT_USER_CAPACITY = float(os.getenv("RATE_LIMIT_USER_CAPACITY", 20))
+RATE_LIMIT_USER_REFILL_PER_SECOND = float(os.getenv("RATE_LIMIT_USER_REFILL_PER_SECOND", 0.25))
+# Requests of a route group in progress at once in this worker
+RATE_LIMIT_AUTH_CONCURRENCY = int(os.getenv("RATE_LIMIT_AUTH_CONCURRENCY", 16))
+RATE_LIMIT_AI_CONCURRENCY = int(os.getenv("RATE_LIMIT_AI_CONCURRENCY", 32))
+RATE_LIMIT_TRANSFER_CONCURRENCY = int(os.getenv("RATE_LIMIT_TRANSFER_CONCURRENCY", 4))
+# Comma-separated IPs/CIDRs of proxies whose X-Forwarded-For is believed, or
+# "*" when the app is only reachable through one platform router (the
+# Procfile sets this). Without it every client behind the router shares
+# the router's IP bucket.
+RATE_LIMIT_TRUSTED_PROXIES = os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")
+
+# (method, path) -> (route group, tokens charged per request)
+ROUTE_LIMITS = {
+    ("POST", "/auth/login"): ("auth", 1),
+    ("POST", "/auth/signup"): ("auth", 2),
+    ("POST", "/ai/summary"): ("ai", 5),
+    ("POST", "/ai/summary/stream"): ("ai", 5),
+    ("POST", "/ai/summary/jobs"): ("ai", 5),
+    ("GET", "/tasks/export"): ("transfer", 5),
+    ("POST", "/tasks/import"): ("transfer", 5),
+}
+GROUP_CONCURRENCY = {
+    "auth": RATE_LIMIT_AUTH_CONCURRENCY,
+    "ai": RATE_LIMIT_AI_CONCURRENCY,
+    "transfer": RATE_LIMIT_TRANSFER_CONCURRENCY,
+}
+
+
+def refill(tokens: float, updated_at: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+
+def take_tokens(read, write, charges, now: float) -> float:
+    """
+    Charge every bucket in `charges` or none of them.
+
+    Args:
+        read: key -> (tokens, updated_at) or None for a new (full) bucket
+        write: Stores (key, tokens, updated_at)
+        charges: List of (key, cost, capacity, refill_per_second)
+        now: Current time
+
+    Returns:
+        0 if charged, else seconds until the emptiest bucket could pay
+    """
+    balances = []
+    wait = 0.0
+    for key, cost, capacity, rate in charges:
+        state = read(key)
+        tokens = capacity if state is None else refill(state[0], state[1], now, capacity, rate)
+        if tokens < cost:
+            wait = max(wait, (cost - tokens) / rate)
+        balances.append((key, tokens - cost))
+    if wait > 0:
+        return wait
+    for key, tokens in balances:
+        write(key, tokens, now)
+    return 0.0
+
+
+class TrustedProxies:
+    """
+    Resolves the client IP of a request from X-Forwarded-For.
+
+    The header is only read when the direct peer is a trusted proxy. Hops
+    are then walked from the right, skipping trusted proxies, and the first
+    other address is the client: entries further left were written by the
+    client itself and could be forged. With "*" the peer is trusted as a
+    single router and the rightmost hop, which it appended, is the client.
+    """
+
+    def __init__(self, spec: str = RATE_LIMIT_TRUSTED_PROXIES):
+        names = [name.strip() for name in spec.split(",") if name.strip()]
+        self.any_peer = "*" in names
+        self.networks = [ipaddress.ip_network(name, strict=False) for name in names if name != "*"]
+
+    def is_trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.networks)
+
+    def client_ip(self, peer: str, forwarded_for: str = None) -> str:
+        if not forwarded_for or not (self.any_peer or self.is_trusted(peer)):
+            return peer
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if not hops:
+            return peer
+        if self.any_peer:
+            return hops[-1]
+        for hop in reversed(hops):
+            if not self.is_trusted(hop):
+                return hop
+        return hops[0]
+
+
+class MemoryBucketBackend:
+    """Process-local token buckets; each worker limits on its own."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    def _write(self, key: str, tokens: float, updated_at: float):
+        self._buckets[key] = (tokens, updated_at)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            # An evicted bucket comes back full, which only errs towards allowing
+            self._buckets.popitem(last=False)
+
+    async def take(self, charges) -> float:
+        return take_tokens(self._buckets.get, self._write, charges, time.monotonic())
+
+
+class SQLiteBucketBackend:
+    """
+    Token buckets in a SQLite file shared by every worker on the host.
+
+    Each take is one IMMEDIATE transaction run in a worker thread, so
+    concurrent workers never charge the same tokens twice. Buckets idle for
+    an hour are full again and get deleted.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_PATH):
+        self.path = path
+        self._takes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_buckets_updated ON rate_buckets (updated_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _take(self, charges) -> float:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                wait = take_tokens(
+                    lambda key: conn.execute(
+                        "SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)).fetchone(),
+                    lambda key, tokens, updated_at: conn.execute(
+                        "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                        (key, tokens, updated_at)),
+                    charges, now,
+                )
+                self._takes += 1
+                if self._takes % 1000 == 0:
+                    conn.execute("DELETE FROM rate_buckets WHERE updated_at < ?", (now - 3600,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    async def take(self, charges) -> float:
+        return await asyncio.to_thread(self._take, charges)
+
+
+class RateLimiter:
+    """
+    Admission control for expensive routes.
+
+    A request to a route in ROUTE_LIMITS must get a slot under its group's
+    concurrency cap, then pay the route's cost from its client IP's bucket
+    and, when it carries a bearer token, from its user's bucket. Buckets
+    live in a pluggable backend; concurrency slots are per worker.
+    """
+
+    def __init__(self, backend, routes: dict = None, group_concurrency: dict = None,
+                 ip_capacity: float = RATE_LIMIT_IP_CAPACITY, ip_refill: float = RATE_LIMIT_IP_REFILL_PER_SECOND,
+                 user_capacity: float = RATE_LIMIT_USER_CAPACITY,
+                 user_refill: float = RATE_LIMIT_USER_REFILL_PER_SECOND, enabled: bool = RATE_LIMIT_ENABLED,
+                 trusted_proxies: str = RATE_LIMIT_TRUSTED_PROXIES):
+        if ip_refill <= 0 or user_refill <= 0:
+            raise ValueError("Rate limit refill rates must be positive")
+        self.backend = backend
+        self.routes = ROUTE_LIMITS if routes is None else routes
+        self.group_concurrency = GROUP_CONCURRENCY if group_concurrency is None else group_concurrency
+        self.ip_capacity = ip_capacity
+        self.ip_refill = ip_refill
+        self.user_capacity = user_capacity
+        self.user_refill = user_refill
+        self.enabled = enabled
+        self.proxies = TrustedProxies(trusted_proxies)
+        self.in_flight = {}
+        self.admitted = 0
+        self.rate_limited = 0
+        self.concurrency_limited = 0
+
+    def route_for(self, method: str, path: str):
+        return self.routes.get((method, path.rstrip("/") or "/"))
+
+    def user_key(self, token: str) -> str:
+        # Only a token already verified by get_current_user maps to a user;
+        # unverified ones get their own bucket, so a forged token cannot
+        # drain someone else's
+        principal = principal_cache.peek(token)
+        if principal is not None:
+            return f"user:{principal.id}"
+        return "token:" + hashlib.sha256(token.encode()).hexdigest()[:32]
+
+    async def admit(self, group: str, cost: float, client_ip: str, token: str = None):
+        """
+        Try to admit one request; call release(group) when it finishes.
+
+        Returns:
+            None if admitted, else (status code, seconds to wait)
+        """
+        in_flight = self.in_flight.get(group, 0)
+        if in_flight >= self.group_concurrency.get(group, math.inf):
+            self.concurrency_limited += 1
+            return 503, 1.0
+        self.in_flight[group] = in_flight + 1
+
+        charges = [(f"ip:{client_ip}", cost, self.ip_capacity, self.ip_refill)]
+        if token:
+            charges.append((self.user_key(token), cost, self.user_capacity, self.user_refill))
+        try:
+            wait = await self.backend.take(charges)
+        except BaseException:
+            self.release(group)
+            raise
+        if wait > 0:
+            self.release(group)
+            self.rate_limited += 1
+            return 429, wait
+        self.admitted += 1
+        return None
+
+    def release(self, group: str):
+        self.in_flight[group] -= 1
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "in_flight": dict(self.in_flight),
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "concurrency_limited": self.concurrency_limited,
+        }
+
+
+def bearer_token(scope) -> str:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token.strip()
+    return None
+
+
+def forwarded_for(scope) -> str:
+    # Repeated headers are one list, in order
+    values = [value.decode("latin-1") for name, value in scope.get("headers", ()) if name == b"x-forwarded-for"]
+    return ",".join(values) or None
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying a RateLimiter before routing.
+
+    Rejections are answered here, so an over-limit request costs no
+    database query, password hash or upstream call.
+    """
+
+    def __init__(self, app, limiter: RateLimiter = None):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiter or rate_limiter
+        route = limiter.route_for(scope.get("method", ""), scope.get("path", "")) \
+            if scope["type"] == "http" and limiter.enabled else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        group, cost = route
+        peer = scope["client"][0] if scope.get("client") else "unknown"
+        client_ip = limiter.proxies.client_ip(peer, forwarded_for(scope))
+        rejection = await limiter.admit(group, cost, client_ip, bearer_token(scope))
+        if rejection is not None:
+            status_code, wait = rejection
+            detail = "Too many requests, please retry later" if status_code == 429 else "Server busy, please retry"
+            response = JSONResponse(
+                status_code=status_code,
+                content={"detail": detail},
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(group)
+
+
+def create_backend(kind: str = RATE_LIMIT_BACKEND):
+    if kind == "sqlite":
+        return SQLiteBucketBackend()
+    if kind == "memory":
+        return MemoryBucketBackend()
+    raise ValueError(f"Unknown rate limit backend: {kind}")
+
+
+rate_limiter = RateLimiter(create_backend())
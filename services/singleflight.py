@@ -0,0 +1,44 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as its own task; callers
+    arriving while it runs await the same result (or exception). The work
+    is shielded, so a disconnecting caller does not cancel it for the rest.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn):
+        """
+        Run `fn()` for `key`, or join the run already in flight.
+
+        Args:
+            key: Identity of the computation
+            fn: Zero-argument coroutine function
+
+        Returns:
+            The result of the shared call
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone
+from sqlalchemy import func, inspect, literal, select, text, update
+from sqlalchemy.types import DateTime
+from sqlalchemy.schema import CreateIndex, CreateTable
+from config import env_bool
+from database import Base
+from services import task_search
+import models
+
+# auto: create the schema only when the stored version differs from this
+# build's; always: create_all on every boot; off: schema is managed elsewhere
+SCHEMA_SYNC = os.getenv("SCHEMA_SYNC", "auto")
+if SCHEMA_SYNC not in ("auto", "always", "off"):
+    raise ValueError("SCHEMA_SYNC must be auto, always or off")
+# Run start-up work on the first request instead of at boot, so a new
+# worker accepts connections without touching the database
+LAZY_STARTUP = env_bool("LAZY_STARTUP", False)
+
+# pg_advisory_xact_lock key serialising schema creation across workers
+SCHEMA_LOCK_KEY = 0x7A5CF10
+# Part of the fingerprint; bump when sync_schema learns a new upgrade step,
+# so databases stamped by an older build run it once
+SCHEMA_SYNC_REVISION = 2
+
+logger = logging.getLogger("taskflow.startup")
+
+
+def schema_version(dialect) -> str:
+    """Fingerprint of the DDL this build would emit for a dialect."""
+    digest = hashlib.sha256(f"sync-revision:{SCHEMA_SYNC_REVISION}".encode())
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda i: str(i.name)):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    search_ddl = {"postgresql": task_search.POSTGRES_DDL, "sqlite": task_search.SQLITE_DDL}
+    for statement in search_ddl.get(dialect.name, ()):
+        digest.update(statement.encode())
+    return digest.hexdigest()[:32]
+
+
+def _stored_version(connection):
+    if not inspect(connection).has_table(models.SchemaVersion.__tablename__):
+        return None
+    return connection.execute(select(models.SchemaVersion.version).filter(models.SchemaVersion.id == 1)).scalar()
+
+
+# (table, column) -> fn(connection), run once right after the column is added
+# to an existing table, to fill in rows written before it existed
+COLUMN_BACKFILLS = {}
+
+
+def backfill(table_name: str, column_name: str):
+    def register(fn):
+        COLUMN_BACKFILLS[(table_name, column_name)] = fn
+        return fn
+    return register
+
+
+@backfill("tasks", "updated_at")
+def _task_updated_at(connection):
+    # Rows with no updated_at would fall out of the (updated_at, id) keyset
+    # that delta sync walks; they are taken as last changed when created
+    tasks = models.Task.__table__
+    connection.execute(update(tasks).where(tasks.c.updated_at.is_(None)).values(
+        updated_at=func.coalesce(tasks.c.created_at, literal(datetime.now(timezone.utc), DateTime(timezone=True)))))
+
+
+@backfill("subtasks", "updated_at")
+def _subtask_updated_at(connection):
+    subtasks = models.Subtask.__table__
+    connection.execute(update(subtasks).where(subtasks.c.updated_at.is_(None)).values(
+        updated_at=datetime.now(timezone.utc)))
+
+
+@backfill("tasks", "subtask_total")
+def _count_subtasks(connection):
+    # Same recount as repair_subtask_counts, in one statement; plain SQL so
+    # the ORM's onupdate does not touch updated_at
+    connection.exec_driver_sql(
+        "UPDATE tasks SET subtask_total = (SELECT count(*) FROM subtasks WHERE subtasks.task_id = tasks.id)")
+
+
+@backfill("tasks", "subtask_completed")
+def _count_completed_subtasks(connection):
+    connection.exec_driver_sql(
+        "UPDATE tasks SET subtask_completed = (SELECT count(*) FROM subtasks "
+        "WHERE subtasks.task_id = tasks.id AND subtasks.is_completed)")
+
+
+def _add_missing_columns(connection):
+    """
+    ALTER existing tables to add columns the models define but the table lacks.
+
+    create_all only creates whole tables. Constant server defaults are added
+    with the column, so NOT NULL counters fill themselves; expression
+    defaults such as now() cannot be added to a populated SQLite table, so
+    those columns are added bare, backfilled, then given their default
+    where the dialect allows it.
+
+    Returns:
+        List of "table.column" names added
+    """
+    inspector = inspect(connection)
+    ddl = connection.dialect.ddl_compiler(connection.dialect, None)
+    preparer = connection.dialect.identifier_preparer
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            constant_default = column.server_default is not None and isinstance(column.server_default.arg, str)
+            spec = f"{preparer.quote(column.name)} {column.type.compile(dialect=connection.dialect)}"
+            if constant_default:
+                spec += f" DEFAULT {ddl.get_column_default_string(column)}"
+                if not column.nullable:
+                    spec += " NOT NULL"
+            connection.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {spec}")
+            fill = COLUMN_BACKFILLS.get((table.name, column.name))
+            if fill is not None:
+                fill(connection)
+            if column.server_default is not None and not constant_default and connection.dialect.name != "sqlite":
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {preparer.format_table(table)} ALTER COLUMN {preparer.quote(column.name)} "
+                    f"SET DEFAULT {ddl.get_column_default_string(column)}"
+                )
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _create_schema(connection, version: str):
+    Base.metadata.create_all(connection)
+    for name in _add_missing_columns(connection):
+        logger.info("Added column %s", name)
+    # create_all skips the indexes of tables that already existed
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    # Also covers databases whose tasks table predates search
+    task_search.ensure_search_index(connection)
+    # Stamped last, so a failed upgrade is retried on the next boot
+    connection.execute(models.SchemaVersion.__table__.delete())
+    connection.execute(models.SchemaVersion.__table__.insert().values(id=1, version=version))
+
+
+async def sync_schema(engine, mode: str = SCHEMA_SYNC) -> str:
+    """
+    Bring the schema up to date unless the stored schema version is current.
+
+    Creates missing tables, adds missing columns to existing ones (with
+    their backfills) and creates missing indexes, all in one transaction.
+    Reflecting every table on each boot is slow; comparing one stored
+    fingerprint is a single query, so restarting workers normally skip it.
+    Columns are never dropped or altered.
+
+    Returns:
+        "current", "created" or "skipped"
+    """
+    if mode == "off":
+        return "skipped"
+    version = schema_version(engine.dialect)
+    async with engine.begin() as conn:
+        if mode == "auto" and await conn.run_sync(_stored_version) == version:
+            return "current"
+        if conn.dialect.name == "postgresql":
+            # Workers booting together take turns; the rest find the version stored
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            if mode == "auto" and await conn.run_sync(_stored_version) == version:
+                return "current"
+        await conn.run_sync(_create_schema, version)
+    logger.info("Database schema synced (version %s)", version)
+    return "created"
+
+
+class StartupGate:
+    """Runs async start-up work once, at boot or before the first request."""
+
+    def __init__(self, work):
+        self.work = work
+        self.done = False
+        self._lock = None
+
+    async def run(self):
+        if self.done:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # A failure leaves the gate open, so the next request retries
+            if not self.done:
+                await self.work()
+                self.done = True
+
+
+class LazyStartupMiddleware:
+    """Pure ASGI middleware that opens a StartupGate on the first request."""
+
+    def __init__(self, app, gate: StartupGate):
+        self.app = app
+        self.gate = gate
+
+    async def __call__(self, scope, receive, send):
+        if not self.gate.done and scope["type"] in ("http", "websocket"):
+            await self.gate.run()
+        await self.app(scope, receive, send)
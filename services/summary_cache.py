@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+SUMMARY_CACHE_BACKEND = os.getenv("SUMMARY_CACHE_BACKEND", "memory")  # memory, sqlite or none
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "./summary_cache.db")
+SUMMARY_CACHE_TTL_SECONDS = int(os.getenv("SUMMARY_CACHE_TTL_SECONDS", 3600))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 1000))
+
+
+class MemoryCacheBackend:
+    """Process-local LRU store with per-entry expiry."""
+
+    def __init__(self, max_entries: int = SUMMARY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: dict, ttl: float):
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def add(self, key: str, value, ttl: float) -> bool:
+        """Store value only if key is missing or expired; returns whether it was stored."""
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str, expected=None):
+        """Remove key, or only while it still holds `expected` when one is given."""
+        entry = self._entries.get(key)
+        if entry is not None and (expected is None or entry[1] == expected):
+            del self._entries[key]
+
+    async def clear(self):
+        self._entries.clear()
+
+
+class SQLiteCacheBackend:
+    """
+    File-backed store so cached summaries survive restarts.
+
+    Queries run in a worker thread; rows past max_entries are evicted by
+    least recent access.
+    """
+
+    def __init__(self, path: str = SUMMARY_CACHE_PATH, max_entries: int = SUMMARY_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summary_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_summary_cache_accessed ON summary_cache (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _get(self, key: str):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM summary_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute("DELETE FROM summary_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE summary_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+
+    def _set(self, key: str, value: dict, ttl: float):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO summary_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            conn.execute("DELETE FROM summary_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM summary_cache WHERE key NOT IN "
+                "(SELECT key FROM summary_cache ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def _add(self, key: str, value, ttl: float) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM summary_cache WHERE key = ? AND expires_at <= ?", (key, now))
+            # One statement, so concurrent workers cannot both claim the key
+            cursor = conn.execute(
+                "INSERT INTO summary_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO NOTHING",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            return cursor.rowcount == 1
+
+    def _delete(self, key: str, expected=None):
+        with self._connect() as conn:
+            if expected is None:
+                conn.execute("DELETE FROM summary_cache WHERE key = ?", (key,))
+            else:
+                conn.execute("DELETE FROM summary_cache WHERE key = ? AND value = ?", (key, json.dumps(expected)))
+
+    def _clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM summary_cache")
+
+    async def get(self, key: str):
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: dict, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def add(self, key: str, value, ttl: float) -> bool:
+        return await asyncio.to_thread(self._add, key, value, ttl)
+
+    async def delete(self, key: str, expected=None):
+        await asyncio.to_thread(self._delete, key, expected)
+
+    async def clear(self):
+        await asyncio.to_thread(self._clear)
+
+
+class SummaryCache:
+    """
+    Content-addressed cache of model output keyed by a hash of the prompt.
+
+    Tracks hit rate and how much upstream latency the hits avoided.
+    """
+
+    def __init__(self, backend=None, ttl_seconds: int = SUMMARY_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def fingerprint(model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model}\n{prompt}".encode()).hexdigest()
+
+    async def get(self, key: str):
+        if self.backend is None:
+            return None
+        entry = await self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_seconds += entry.get("latency", 0.0)
+        return entry["value"]
+
+    async def set(self, key: str, value: dict, latency: float = 0.0):
+        """
+        Store a model result.
+
+        Args:
+            key: Fingerprint from SummaryCache.fingerprint
+            value: JSON-serializable result
+            latency: Seconds the upstream call took, credited on later hits
+        """
+        if self.backend is None or self.ttl_seconds <= 0:
+            return
+        await self.backend.set(key, {"value": value, "latency": latency}, self.ttl_seconds)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_upstream_seconds": round(self.saved_seconds, 3),
+        }
+
+
+def create_backend(kind: str = SUMMARY_CACHE_BACKEND):
+    if kind == "none":
+        return None
+    if kind == "sqlite":
+        return SQLiteCacheBackend()
+    if kind == "memory":
+        return MemoryCacheBackend()
+    raise ValueError(f"Unknown summary cache backend: {kind}")
+
+
+summary_cache = SummaryCache(create_backend())
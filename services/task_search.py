@@ -0,0 +1,124 @@
+import os
+import re
+from sqlalchemy import event, func, literal_column, cast, or_, text, table, column
+from sqlalchemy.dialects.postgresql import REGCONFIG
+import models
+
+# PostgreSQL text search configuration used for stemming and stop words
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "english")
+if not re.fullmatch(r"[a-z_]+", SEARCH_LANGUAGE):
+    raise ValueError("SEARCH_LANGUAGE must be a PostgreSQL text search configuration name")
+
+# Title matches outrank description matches
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 5.0
+
+# PostgreSQL: a generated tsvector column is maintained by the database on
+# every INSERT/UPDATE, so no write path can forget to update it.
+POSTGRES_DDL = (
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(description, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING GIN (search_vector)",
+)
+
+# SQLite: an external-content FTS5 table over tasks, kept in sync by
+# triggers. It is keyed by the implicit rowid, so run rebuild_search_index
+# after a VACUUM.
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+    "title, description, content='tasks', content_rowid='rowid', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); "
+    "INSERT INTO tasks_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); END",
+)
+
+tasks_fts = table("tasks_fts", column("rowid"))
+
+
+def ensure_search_index(connection):
+    """
+    Create the search column/table and its index if missing (idempotent).
+
+    Takes a sync connection, e.g. via AsyncConnection.run_sync.
+    """
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+    elif dialect == "sqlite":
+        existed = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'").first()
+        for statement in SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+        if not existed:
+            # Index tasks written before the table existed
+            rebuild_search_index(connection)
+
+
+def rebuild_search_index(connection):
+    """Re-index every task from the tasks table (SQLite only)."""
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+@event.listens_for(models.Task.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    ensure_search_index(connection)
+
+
+@event.listens_for(models.Task.__table__, "after_drop")
+def _drop_search_index(target, connection, **kw):
+    # The PostgreSQL column and index go with the table; the FTS5 table does not
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS tasks_fts")
+
+
+def sqlite_match_expression(q: str):
+    # Quote each word so user input can never be parsed as FTS5 syntax;
+    # all words must match, like websearch_to_tsquery without operators.
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return " ".join('"' + word + '"' for word in words)
+
+
+def apply_search(query, dialect: str, q: str):
+    """
+    Restrict a Task select to matches for q and add a "rank" column.
+
+    Higher rank is a better match.
+
+    Returns:
+        Tuple of (query, rank expression), or (None, None) if q has no searchable words
+    """
+    if dialect == "postgresql":
+        vector = literal_column("tasks.search_vector")
+        tsquery = func.websearch_to_tsquery(cast(SEARCH_LANGUAGE, REGCONFIG), q)
+        rank = func.ts_rank(vector, tsquery)
+        return query.add_columns(rank.label("rank")).filter(vector.op("@@")(tsquery)), rank
+
+    if dialect == "sqlite":
+        match = sqlite_match_expression(q)
+        if match is None:
+            return None, None
+        # bm25 is lower-is-better, so negate it
+        rank = -func.bm25(literal_column("tasks_fts"), TITLE_WEIGHT, DESCRIPTION_WEIGHT)
+        query = query.add_columns(rank.label("rank")).join(
+            tasks_fts, tasks_fts.c.rowid == literal_column("tasks.rowid")
+        ).filter(text("tasks_fts MATCH :match").bindparams(match=match))
+        return query, rank
+
+    # Other databases: unranked substring match
+    pattern = f"%{q}%"
+    rank = literal_column("0.0")
+    query = query.add_columns(rank.label("rank")).filter(
+        or_(models.Task.title.ilike(pattern), models.Task.description.ilike(pattern)))
+    return query, rank
@@ -0,0 +1,150 @@
+import codecs
+import csv
+import io
+import json
+import os
+from datetime import datetime
+
+# A record (NDJSON line or CSV row) larger than this aborts an import, so
+# one malformed upload cannot make the parser buffer without bound
+IMPORT_MAX_RECORD_BYTES = int(os.getenv("IMPORT_MAX_RECORD_BYTES", 1024 * 1024))
+# Export responses are flushed in chunks of roughly this size
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+CSV_COLUMNS = ("id", "title", "description", "category", "priority", "status", "deadline",
+               "created_at", "updated_at", "subtasks")
+
+
+class RecordTooLarge(ValueError):
+    """Raised when a single import record exceeds IMPORT_MAX_RECORD_BYTES."""
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+async def _chunked(lines):
+    buffer, size = [], 0
+    async for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+async def ndjson_lines(tasks):
+    """Serialize exported task dicts as newline-delimited JSON, in chunks."""
+    async def lines():
+        async for task in tasks:
+            yield json.dumps(task, default=_json_default) + "\n"
+    async for chunk in _chunked(lines()):
+        yield chunk
+
+
+async def csv_lines(tasks):
+    """Serialize exported task dicts as CSV with a header row; subtasks become a JSON column."""
+    async def lines():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(CSV_COLUMNS)
+        async for task in tasks:
+            row = dict(task, subtasks=json.dumps(
+                [{"title": s["title"], "is_completed": s["is_completed"]} for s in task["subtasks"]]))
+            writer.writerow(
+                "" if row[column] is None else
+                row[column].isoformat() if isinstance(row[column], datetime) else row[column]
+                for column in CSV_COLUMNS
+            )
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    async for chunk in _chunked(lines()):
+        yield chunk
+
+
+async def _text_lines(chunks):
+    # Split a byte stream into lines without holding more than one line
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+        if len(pending) > IMPORT_MAX_RECORD_BYTES:
+            raise RecordTooLarge(f"Record exceeds {IMPORT_MAX_RECORD_BYTES} bytes")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def ndjson_records(chunks):
+    """
+    Parse an NDJSON byte stream incrementally.
+
+    Yields (line number, dict) for each non-blank line, or
+    (line number, ValueError) for a line that is not a JSON object.
+    """
+    line_number = 0
+    async for line in _text_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("Expected a JSON object")
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        yield line_number, record
+
+
+async def csv_records(chunks):
+    """
+    Parse a CSV byte stream with a header row incrementally.
+
+    Quoted fields may span lines. Yields (line number, dict) per row, with
+    empty cells as None, or (line number, ValueError) for a malformed row.
+
+    Raises:
+        ValueError: If the header row is missing or lacks a title column
+    """
+    header = None
+    record, record_start, line_number = "", 0, 0
+    async for line in _text_lines(chunks):
+        line_number += 1
+        if not record:
+            record_start = line_number
+        record += line
+        # An odd number of quotes means a quoted field continues on the next line
+        if record.count('"') % 2:
+            if len(record) > IMPORT_MAX_RECORD_BYTES:
+                raise RecordTooLarge(f"Record exceeds {IMPORT_MAX_RECORD_BYTES} bytes")
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            yield record_start, ValueError(f"Invalid CSV: {e}")
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            if "title" not in header:
+                raise ValueError("CSV header must include a title column")
+            continue
+        if len(values) != len(header):
+            yield record_start, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield record_start, {name: value if value != "" else None for name, value in zip(header, values)}
+    if record.strip():
+        yield record_start, ValueError("Unterminated quoted field")
+    if header is None:
+        raise ValueError("CSV header row is missing")
@@ -0,0 +1,37 @@
+import time
+from services.auth_cache import PrincipalCache
+
+
+def test_principal_cache_hit_and_miss():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10)
+    assert cache.get("token-a") is None
+    cache.set("token-a", "a@example.com", {"id": "a"})
+    assert cache.get("token-a") == {"id": "a"}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_principal_cache_lru_eviction_and_expiry():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=2)
+    cache.set("t1", "a@example.com", "a")
+    cache.set("t2", "b@example.com", "b")
+    cache.get("t1")
+    cache.set("t3", "c@example.com", "c")
+    assert cache.get("t2") is None
+    assert cache.get("t1") == "a"
+    assert cache.stats()["evictions"] == 1
+
+    # Tokens that are already past their exp claim are never cached
+    cache.set("t4", "d@example.com", "d", expires_at=time.time() - 1)
+    assert cache.get("t4") is None
+
+
+def test_principal_cache_invalidate_user():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10)
+    cache.set("t1", "a@example.com", "a")
+    cache.set("t2", "a@example.com", "a")
+    cache.set("t3", "b@example.com", "b")
+    cache.invalidate_user("a@example.com")
+    assert cache.get("t1") is None
+    assert cache.get("t2") is None
+    assert cache.get("t3") == "b"
@@ -0,0 +1,66 @@
+import pytest
+from services.change_feed import ChangeFeed, FeedFull, InProcessBroker
+from routers.events import sse_stream
+
+
+@pytest.mark.asyncio
+async def test_change_feed_delivers_per_user_and_enforces_limits():
+    feed = ChangeFeed(InProcessBroker(), max_connections=3, max_connections_per_user=2, buffer_size=10)
+    first = await feed.subscribe("alice")
+    second = await feed.subscribe("alice")
+    other = await feed.subscribe("bob")
+    with pytest.raises(FeedFull):
+        await feed.subscribe("alice")
+    with pytest.raises(FeedFull):
+        await feed.subscribe("carol")
+
+    await feed.publish("alice", "task.created", task_id="t1")
+    assert (await first.get(timeout=1))["task_id"] == "t1"
+    assert (await second.get(timeout=1))["type"] == "task.created"
+    assert await other.get(timeout=0.01) is None
+
+    await feed.publish_many("bob", "tasks.deleted", [str(i) for i in range(500)])
+    assert (await other.get(timeout=1))["type"] == "resync"
+
+    feed.unsubscribe(first)
+    feed.unsubscribe(first)
+    assert feed.stats()["connections"] == 2
+    await feed.subscribe("carol")
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_resynced_and_stream_ends(monkeypatch):
+    feed = ChangeFeed(InProcessBroker(), buffer_size=2)
+    subscription = await feed.subscribe("alice")
+    for i in range(3):
+        await feed.publish("alice", "task.updated", task_id=str(i))
+
+    assert subscription.closed
+    assert feed.stats()["overflowed"] == 1
+
+    import routers.events as events
+    monkeypatch.setattr(events, "change_feed", feed)
+    messages = [message async for message in sse_stream(subscription, heartbeat_seconds=1)]
+    assert messages[0].startswith("retry:")
+    assert messages[1].startswith("event: resync\n")
+    assert feed.stats()["connections"] == 0
+
+
+@pytest.mark.asyncio
+async def test_events_published_in_a_transaction_wait_for_its_commit():
+    from sqlalchemy import text
+    from database import SessionLocal
+
+    feed = ChangeFeed(InProcessBroker())
+    subscription = await feed.subscribe("alice")
+    async with SessionLocal() as db:
+        await db.execute(text("SELECT 1"))
+        await feed.publish("alice", "task.deleted", db, task_id="rolled-back")
+        await db.rollback()
+        await db.execute(text("SELECT 1"))
+        await feed.publish("alice", "task.created", db, task_id="committed")
+        assert await subscription.get(timeout=0.01) is None
+        await db.commit()
+
+    assert (await subscription.get(timeout=1))["task_id"] == "committed"
+    assert await subscription.get(timeout=0.01) is None
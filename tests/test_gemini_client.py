@@ -0,0 +1,87 @@
+import asyncio
+import httpx
+import pytest
+from httpx import ASGITransport
+from scripts.gemini_stub import create_app
+from services.gemini_client import GeminiClient, CircuitBreaker, CircuitOpenError
+
+
+@pytest.mark.asyncio
+async def test_gemini_client_retries_transient_errors():
+    stub = create_app()
+    client = GeminiClient(api_key="test-key", max_retries=2, retry_base_delay=0,
+                          transport=ASGITransport(app=stub))
+    assert "Stub Insight" in await client.generate("prompt")
+
+    flaky = create_app(error_rate=1.0)
+    client = GeminiClient(api_key="test-key", max_retries=2, retry_base_delay=0,
+                          transport=ASGITransport(app=flaky))
+    with pytest.raises(Exception):
+        await client.generate("prompt")
+    assert flaky.state.calls == 3
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_gemini_client_circuit_breaker_short_circuits():
+    stub = create_app(error_rate=1.0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    client = GeminiClient(api_key="test-key", max_retries=0, breaker=breaker,
+                          transport=ASGITransport(app=stub))
+    for _ in range(2):
+        with pytest.raises(Exception):
+            await client.generate("prompt")
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        await client.generate("prompt")
+    assert stub.state.calls == 2
+    assert client.stats()["short_circuited"] == 1
+
+    # After the reset window a single trial call is let through
+    breaker.reset_seconds = 0
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_trial_frees_the_breaker():
+    stub = create_app(latency_ms=1000)
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    client = GeminiClient(api_key="test-key", max_retries=0, breaker=breaker,
+                          transport=ASGITransport(app=stub))
+    trial = asyncio.create_task(client.generate("prompt"))
+    await asyncio.sleep(0.05)
+    assert breaker.state == "half_open"
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    # The next call becomes the new trial instead of being short-circuited
+    await client.close()
+    client = GeminiClient(api_key="test-key", max_retries=0, breaker=breaker,
+                          transport=ASGITransport(app=create_app()))
+    assert "Stub Insight" in await client.generate("prompt")
+    assert breaker.state == "closed"
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_api_key_is_sent_in_a_header_not_the_url():
+    seen = []
+
+    def reply(request):
+        seen.append(request)
+        return httpx.Response(500)
+
+    client = GeminiClient(api_key="secret-key", max_retries=0, transport=httpx.MockTransport(reply))
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        await client.generate("prompt")
+    await client.close()
+
+    assert seen[0].headers["x-goog-api-key"] == "secret-key"
+    assert "secret-key" not in str(seen[0].url)
+    assert "secret-key" not in str(error.value)
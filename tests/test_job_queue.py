@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from services.job_queue import JobConflict, JobQueue
+from services.summary_cache import MemoryCacheBackend, SQLiteCacheBackend
+
+
+async def wait_for(queue, job_id):
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_share_one_job():
+    queue = JobQueue(MemoryCacheBackend(max_entries=100), workers=1)
+    calls = []
+
+    async def run():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    results = await asyncio.gather(*(queue.submit("owner", run) for _ in range(5)))
+    assert len({job["id"] for job, _ in results}) == 1
+    assert [created for _, created in results].count(True) == 1
+
+    job = await wait_for(queue, results[0][0]["id"])
+    assert job["status"] == "succeeded"
+    assert calls == [1]
+    # The slot is released once the job finishes
+    _, created = await queue.submit("owner", run)
+    assert created
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_workers_sharing_a_sqlite_store_claim_the_slot_once(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    queues = [JobQueue(SQLiteCacheBackend(path, max_entries=100), workers=1) for _ in range(3)]
+
+    async def run():
+        await asyncio.sleep(0.05)
+        return None
+
+    results = await asyncio.gather(*(queue.submit("owner", run) for queue in queues for _ in range(3)))
+    assert len({job["id"] for job, _ in results}) == 1
+    assert [created for _, created in results].count(True) == 1
+    for queue in queues:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_recorded_and_frees_the_slot():
+    queue = JobQueue(MemoryCacheBackend(max_entries=100), workers=1)
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    job, _ = await queue.submit("owner", fail)
+    job = await wait_for(queue, job["id"])
+    assert (job["status"], job["error"]) == ("failed", "boom")
+    assert await queue.get_active("owner") is None
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_a_dead_worker_are_reclaimed(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    crashed = JobQueue(SQLiteCacheBackend(path, max_entries=100), workers=1, stale_seconds=0.2)
+    survivor = JobQueue(SQLiteCacheBackend(path, max_entries=100), workers=1, stale_seconds=0.2)
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    lost, _ = await crashed.submit("owner", hang)
+    await asyncio.sleep(0.05)
+    # The worker goes away mid-job: no heartbeat, no final save
+    await crashed.stop()
+    assert (await survivor.submit("owner", hang))[0]["id"] == lost["id"]
+
+    await asyncio.sleep(0.25)
+    assert (await survivor.get(lost["id"]))["status"] == "failed"
+    job, created = await survivor.submit("owner", hang)
+    assert created and job["id"] != lost["id"]
+    await survivor.stop()
+
+
+@pytest.mark.asyncio
+async def test_losing_the_claim_to_a_finished_job_is_a_conflict(monkeypatch):
+    queue = JobQueue(MemoryCacheBackend(max_entries=100), workers=1)
+
+    async def lost_claim(owner_id, job_id):
+        return False
+
+    monkeypatch.setattr(queue, "_claim", lost_claim)
+    with pytest.raises(JobConflict):
+        await queue.submit("owner", lambda: None)
+    await queue.stop()
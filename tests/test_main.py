@@ -1,11 +1,16 @@
 from utils import create_access_token
-from database import Base, get_db
+from database import Base, get_db, get_sessionmaker
 from main import app
+from services.metrics import instrument_engine
+from services.rate_limit import rate_limiter
 import asyncio
+from datetime import datetime, timezone
+import json
 import pytest
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event
 import sys
 from dotenv import load_dotenv
 import os
@@ -24,6 +29,7 @@ engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False}
 )
+instrument_engine(engine)
 TestingSessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
 
@@ -33,6 +39,10 @@ async def override_get_db():
         yield session
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_sessionmaker] = lambda: TestingSessionLocal
+# The suite signs up and logs in far more often than one client may;
+# rate limiting is enabled explicitly where it is tested
+rate_limiter.enabled = False
 
 
 @pytest.fixture(scope="function")
@@ -44,7 +54,9 @@ def event_loop():
 
 @pytest.fixture(scope="session", autouse=True)
 async def setup_db():
+    # Start from empty tables so fixed test emails do not collide with a previous run
     async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
     yield
     # async with engine.begin() as conn:
@@ -88,3 +100,759 @@ async def test_create_task():
 
     assert response.status_code == 200
     assert response.json()["title"] == "Test Task"
+
+
+async def get_auth_headers(ac, email):
+    await ac.post("/auth/signup", json={"email": email, "password": "password123"})
+    login_res = await ac.post("/auth/login", data={"username": email, "password": "password123"})
+    return {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_invalidated_user_drops_cached_principal():
+    from routers.tasks import get_current_user
+    from services import auth_cache
+    from sqlalchemy import update
+    import models
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/signup", json={"email": "renamed@example.com", "password": "password123",
+                                            "full_name": "Old Name"})
+    token = create_access_token(data={"sub": "renamed@example.com"})
+    async with TestingSessionLocal() as db:
+        first = await get_current_user(token, db)
+        await db.execute(update(models.User).where(models.User.id == first.id).values(full_name="New Name"))
+        await db.commit()
+        stale = await get_current_user(token, db)
+        auth_cache.invalidate_user("renamed@example.com")
+        fresh = await get_current_user(token, db)
+
+    assert first.full_name == "Old Name"
+    assert stale.full_name == "Old Name"
+    assert fresh.full_name == "New Name"
+
+
+@pytest.mark.asyncio
+async def test_read_tasks_cursor_pagination():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "pager@example.com")
+        for i in range(5):
+            await ac.post("/tasks/", json={"title": f"Task {i}", "category": "Work", "priority": "low"}, headers=headers)
+
+        first = await ac.get("/tasks/?limit=2", headers=headers)
+        cursor = first.headers["X-Next-Cursor"]
+        second = await ac.get(f"/tasks/?limit=2&cursor={cursor}", headers=headers)
+        third = await ac.get(f"/tasks/?limit=2&cursor={second.headers['X-Next-Cursor']}", headers=headers)
+        invalid = await ac.get("/tasks/?cursor=not-a-cursor", headers=headers)
+
+    titles = [t["title"] for page in (first, second, third) for t in page.json()]
+    assert titles == ["Task 4", "Task 3", "Task 2", "Task 1", "Task 0"]
+    assert "X-Next-Cursor" not in third.headers
+    assert invalid.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_read_tasks_filter_and_sort():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "filter@example.com")
+        for title, priority, status, deadline in [
+            ("Later", "high", "pending", "2030-01-03T00:00:00"),
+            ("No deadline", "high", "pending", None),
+            ("Sooner", "high", "pending", "2030-01-01T00:00:00"),
+            ("Done", "high", "completed", "2030-01-02T00:00:00"),
+            ("Low", "low", "pending", "2030-01-02T00:00:00"),
+        ]:
+            await ac.post("/tasks/", json={"title": title, "category": "Work", "priority": priority,
+                                           "status": status, "deadline": deadline}, headers=headers)
+
+        params = "status=pending&priority=high&sort=deadline&limit=1"
+        titles = []
+        response = await ac.get(f"/tasks/?{params}", headers=headers)
+        while True:
+            titles += [t["title"] for t in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            response = await ac.get(f"/tasks/?{params}&cursor={response.headers['X-Next-Cursor']}", headers=headers)
+
+        ranged = await ac.get("/tasks/?deadline_after=2030-01-02T00:00:00&deadline_before=2030-01-03T00:00:00",
+                              headers=headers)
+
+    assert titles == ["Sooner", "Later", "No deadline"]
+    assert sorted(t["title"] for t in ranged.json()) == ["Done", "Low"]
+
+
+@pytest.mark.asyncio
+async def test_read_task_stats():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "stats@example.com")
+        for priority, status, deadline in [
+            ("high", "pending", "2000-01-01T00:00:00"),
+            ("high", "completed", "2000-01-01T00:00:00"),
+            ("low", "in_progress", None),
+            ("high", "pending", "2999-01-01T00:00:00"),
+        ]:
+            await ac.post("/tasks/", json={"title": "Stat", "category": "Work", "priority": priority,
+                                           "status": status, "deadline": deadline}, headers=headers)
+        response = await ac.get("/tasks/stats", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "total": 4, "completed": 1, "pending": 3, "overdue": 1, "highPriority": 2, "completionRate": 25
+    }
+
+
+@pytest.mark.asyncio
+async def test_ai_summary_falls_back_when_gemini_fails(monkeypatch):
+    from routers import ai
+    from scripts.gemini_stub import create_app
+    from services.gemini_client import GeminiClient
+    failing_client = GeminiClient(api_key="test-key", max_retries=0,
+                                  transport=ASGITransport(app=create_app(error_rate=1.0)))
+    monkeypatch.setattr(ai, "gemini_client", failing_client)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "summary@example.com")
+        for title, deadline in [("Later", "2030-01-02T00:00:00"), ("Whenever", None), ("Soon", "2030-01-01T00:00:00")]:
+            await ac.post("/tasks/", json={"title": title, "category": "Work", "priority": "medium",
+                                           "deadline": deadline}, headers=headers)
+        response = await ac.post("/ai/summary", headers=headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["stats"]["pending"] == 3
+    assert body["insights"][0]["title"] == "AI Unavailable"
+    assert [t["title"] for t in body["topTasks"]] == ["Soon", "Later", "Whenever"]
+
+
+@pytest.mark.asyncio
+async def test_ai_summary_rejects_and_does_not_cache_malformed_replies(monkeypatch):
+    import httpx
+    from routers import ai
+    from services.gemini_client import GeminiClient
+    calls = []
+
+    def reply(request):
+        calls.append(request)
+        text = json.dumps({"insights": "not a list", "actionItems": ["ok"]})
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    monkeypatch.setattr(ai, "gemini_client", GeminiClient(api_key="test-key", transport=httpx.MockTransport(reply)))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "malformed@example.com")
+        responses = [await ac.post("/ai/summary", headers=headers) for _ in range(2)]
+
+    assert [r.status_code for r in responses] == [200, 200]
+    assert all(r.json()["insights"] == ai.FALLBACK_INSIGHTS for r in responses)
+    # Nothing was cached, so the second request asked the model again
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_ai_summary_stream_sends_stats_before_insights(monkeypatch):
+    from routers import ai
+    from scripts.gemini_stub import create_app
+    from services.gemini_client import GeminiClient
+    stub_client = GeminiClient(api_key="test-key", transport=ASGITransport(app=create_app(latency_ms=20)))
+    monkeypatch.setattr(ai, "gemini_client", stub_client)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "stream@example.com")
+        await ac.post("/tasks/", json={"title": "Stream", "category": "Work", "priority": "high"}, headers=headers)
+        response = await ac.post("/ai/summary/stream", headers=headers)
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["event"] for e in events] == ["stats", "topTasks", "insights"]
+    assert events[0]["data"]["total"] == 1
+    assert events[1]["data"][0]["title"] == "Stream"
+    assert events[2]["data"]["insights"][0]["title"] == "Stub Insight"
+
+
+@pytest.mark.asyncio
+async def test_ai_summary_job_dedupes_and_completes(monkeypatch):
+    from routers import ai
+    from scripts.gemini_stub import create_app
+    from services.gemini_client import GeminiClient
+    stub_client = GeminiClient(api_key="test-key", transport=ASGITransport(app=create_app(latency_ms=50)))
+    monkeypatch.setattr(ai, "gemini_client", stub_client)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "jobs@example.com")
+        first = await ac.post("/ai/summary/jobs", headers=headers)
+        second = await ac.post("/ai/summary/jobs", headers=headers)
+        assert first.status_code == 202
+        assert second.json()["id"] == first.json()["id"]
+
+        job_id = first.json()["id"]
+        for _ in range(100):
+            job = (await ac.get(f"/ai/summary/jobs/{job_id}", headers=headers)).json()
+            if job["status"] not in ("queued", "running"):
+                break
+            await asyncio.sleep(0.01)
+        other_headers = await get_auth_headers(ac, "jobs-other@example.com")
+        forbidden = await ac.get(f"/ai/summary/jobs/{job_id}", headers=other_headers)
+
+    assert job["status"] == "succeeded"
+    assert job["result"]["insights"][0]["title"] == "Stub Insight"
+    assert forbidden.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_bulk_task_endpoints():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "bulk@example.com")
+        created = await ac.post("/tasks/bulk", json=[
+            {"title": "Bulk 1", "category": "Work", "priority": "low"},
+            {"title": "Missing category", "priority": "low"},
+            {"title": "Bulk 2", "category": "Home", "priority": "high"},
+        ], headers=headers)
+        created_body = created.json()
+        ids = [r["id"] for r in created_body["results"] if r["status"] == "created"]
+        await ac.post(f"/tasks/{ids[0]}/subtasks/", json={"title": "Sub"}, headers=headers)
+
+        updated = await ac.patch("/tasks/bulk", json=[
+            {"id": ids[0], "status": "completed"},
+            {"id": ids[1], "status": "completed"},
+            {"id": "does-not-exist", "status": "completed"},
+        ], headers=headers)
+        stats = await ac.get("/tasks/stats", headers=headers)
+
+        deleted = await ac.request("DELETE", "/tasks/bulk", json={"ids": ids + ["does-not-exist"]}, headers=headers)
+        remaining = await ac.get("/tasks/", headers=headers)
+
+    assert created_body["succeeded"] == 2
+    assert [r["status"] for r in created_body["results"]] == ["created", "invalid", "created"]
+    assert [r["status"] for r in updated.json()["results"]] == ["updated", "updated", "not_found"]
+    assert stats.json()["completed"] == 2
+    assert [r["status"] for r in deleted.json()["results"]] == ["deleted", "deleted", "not_found"]
+    assert remaining.json() == []
+
+
+@pytest.mark.asyncio
+async def test_write_endpoints_statement_count():
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "statements@example.com")
+        await ac.get("/tasks/stats", headers=headers)  # warm the principal cache
+
+        async def count(method, url, **kwargs):
+            statements.clear()
+            event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+            try:
+                response = await ac.request(method, url, headers=headers, **kwargs)
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+            assert response.status_code == 200, response.text
+            return response, len(statements)
+
+        task, n_create = await count("POST", "/tasks/", json={"title": "Count", "category": "Work", "priority": "low"})
+        task_id = task.json()["id"]
+        subtask, n_sub_create = await count("POST", f"/tasks/{task_id}/subtasks/", json={"title": "Sub"})
+        subtask_id = subtask.json()["id"]
+        listed, n_sub_read = await count("GET", f"/tasks/{task_id}/subtasks/")
+        _, n_sub_update = await count("PUT", f"/tasks/{task_id}/subtasks/{subtask_id}", json={"is_completed": True})
+        updated, n_update = await count("PUT", f"/tasks/{task_id}", json={"status": "completed"})
+        _, n_sub_delete = await count("DELETE", f"/tasks/{task_id}/subtasks/{subtask_id}")
+        deleted, n_delete = await count("DELETE", f"/tasks/{task_id}")
+
+    assert [s["title"] for s in listed.json()] == ["Sub"]
+    assert updated.json()["subtasks"][0]["is_completed"] is True
+    assert deleted.json()["status"] == "completed"
+    # Each write also bumps the owner's task revision
+    assert (n_create, n_update, n_delete) == (2, 3, 4)
+    # ...and subtask writes that change the counts refresh the task's counters
+    assert (n_sub_create, n_sub_read, n_sub_update, n_sub_delete) == (3, 1, 3, 3)
+
+
+@pytest.mark.asyncio
+async def test_subtask_counters_are_maintained_and_repairable():
+    from services import crud_service as crud
+    import models
+    from sqlalchemy import update
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "counters@example.com")
+        task = await ac.post("/tasks/", json={"title": "Counted", "category": "Work", "priority": "low"}, headers=headers)
+        task_id = task.json()["id"]
+        assert (task.json()["subtask_total"], task.json()["subtask_completed"]) == (0, 0)
+
+        first = await ac.post(f"/tasks/{task_id}/subtasks/", json={"title": "One"}, headers=headers)
+        await ac.post(f"/tasks/{task_id}/subtasks/", json={"title": "Two", "is_completed": True}, headers=headers)
+        await ac.put(f"/tasks/{task_id}/subtasks/{first.json()['id']}", json={"is_completed": True}, headers=headers)
+        fetched = (await ac.get(f"/tasks/{task_id}", headers=headers)).json()
+        assert (fetched["subtask_total"], fetched["subtask_completed"]) == (2, 2)
+
+        await ac.delete(f"/tasks/{task_id}/subtasks/{first.json()['id']}", headers=headers)
+        fetched = (await ac.get(f"/tasks/{task_id}", headers=headers)).json()
+        assert (fetched["subtask_total"], fetched["subtask_completed"]) == (1, 1)
+
+        async with TestingSessionLocal() as db:
+            await db.execute(update(models.Task).where(models.Task.id == task_id).values(subtask_total=7, subtask_completed=0))
+            await db.commit()
+        async with TestingSessionLocal() as db:
+            assert await crud.repair_subtask_counts(db, batch_size=2) == 1
+            assert await crud.repair_subtask_counts(db) == 0
+        fetched = (await ac.get(f"/tasks/{task_id}", headers=headers)).json()
+        assert (fetched["subtask_total"], fetched["subtask_completed"]) == (1, 1)
+
+
+def test_subtask_writes_lock_the_parent_task_on_postgres():
+    # Concurrent subtask writes to one task must queue on the task row, or
+    # the second recount misses the first insert (see refresh_subtask_counts)
+    from sqlalchemy.dialects import postgresql, sqlite
+    from routers.subtasks import owned_task_ids
+
+    locked = owned_task_ids("task", "user", lock=True)
+    assert str(locked.compile(dialect=postgresql.dialect())).endswith("FOR NO KEY UPDATE")
+    assert "FOR" not in str(locked.compile(dialect=sqlite.dialect()))
+    assert "FOR" not in str(owned_task_ids("task", "user").compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.asyncio
+async def test_task_reads_honour_if_none_match():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "etag@example.com")
+        created = await ac.post("/tasks/", json={"title": "Cached", "category": "Work", "priority": "low"}, headers=headers)
+        task_id = created.json()["id"]
+
+        listed = await ac.get("/tasks/", headers=headers)
+        list_etag = listed.headers["ETag"]
+        detail = await ac.get(f"/tasks/{task_id}", headers=headers)
+        detail_etag = detail.headers["ETag"]
+        assert list_etag != detail_etag
+        assert (await ac.get("/tasks/?limit=1", headers=headers)).headers["ETag"] != list_etag
+
+        unchanged = await ac.get("/tasks/", headers={**headers, "If-None-Match": list_etag})
+        assert unchanged.status_code == 304
+        assert unchanged.headers["ETag"] == list_etag
+        assert (await ac.get(f"/tasks/{task_id}", headers={**headers, "If-None-Match": detail_etag})).status_code == 304
+
+        # A subtask write bumps the revision, so both tags go stale
+        await ac.post(f"/tasks/{task_id}/subtasks/", json={"title": "Step"}, headers=headers)
+        changed = await ac.get("/tasks/", headers={**headers, "If-None-Match": list_etag})
+        assert changed.status_code == 200
+        assert changed.json()[0]["subtasks"][0]["title"] == "Step"
+        assert changed.headers["ETag"] != list_etag
+        assert (await ac.get(f"/tasks/{task_id}", headers={**headers, "If-None-Match": detail_etag})).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_task_reads_include_and_sparse_fields():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "sparse@example.com")
+        for i in range(3):
+            created = await ac.post("/tasks/", json={"title": f"Sparse {i}", "category": "Work", "priority": "low"}, headers=headers)
+        task_id = created.json()["id"]
+        await ac.post(f"/tasks/{task_id}/subtasks/", json={"title": "A", "is_completed": True}, headers=headers)
+        await ac.post(f"/tasks/{task_id}/subtasks/", json={"title": "B"}, headers=headers)
+
+        counts = await ac.get("/tasks/?include=subtask_counts", headers=headers)
+        assert counts.status_code == 200
+        newest = counts.json()[0]
+        assert "subtasks" not in newest
+        assert (newest["subtask_total"], newest["subtask_completed"]) == (2, 1)
+        assert newest["title"] == "Sparse 2"
+
+        none = await ac.get("/tasks/?include=none", headers=headers)
+        assert all("subtasks" not in task and "subtask_total" not in task for task in none.json())
+
+        # Sparse columns still paginate: the sort field is loaded for the cursor only
+        page = await ac.get("/tasks/?fields=title&include=none&limit=2", headers=headers)
+        assert page.json() == [{"id": task_id, "title": "Sparse 2"}, {"id": page.json()[1]["id"], "title": "Sparse 1"}]
+        rest = await ac.get(f"/tasks/?fields=title&include=none&limit=2&cursor={page.headers['X-Next-Cursor']}", headers=headers)
+        assert [task["title"] for task in rest.json()] == ["Sparse 0"]
+
+        detail = await ac.get(f"/tasks/{task_id}?fields=status&include=subtasks", headers=headers)
+        assert detail.json()["status"] == "pending"
+        assert sorted(s["title"] for s in detail.json()["subtasks"]) == ["A", "B"]
+        assert set(detail.json()) == {"id", "status", "subtasks"}
+
+        assert (await ac.get("/tasks/?fields=password", headers=headers)).status_code == 400
+        assert (await ac.get("/tasks/missing?include=none", headers=headers)).status_code == 404
+
+
+def test_openapi_documents_sparse_task_reads():
+    paths = app.openapi()["paths"]
+    listed = paths["/tasks/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    single = paths["/tasks/{task_id}"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert [variant["items"]["$ref"].rsplit("/", 1)[1] for variant in listed["anyOf"]] == ["Task", "TaskSparse"]
+    assert [variant["$ref"].rsplit("/", 1)[1] for variant in single["anyOf"]] == ["Task", "TaskSparse"]
+
+
+@pytest.mark.asyncio
+async def test_search_tasks_ranks_and_stays_in_sync():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "search@example.com")
+        other = await get_auth_headers(ac, "search-other@example.com")
+        in_title = await ac.post("/tasks/", json={"title": "Renew passport", "category": "Errands", "priority": "high"}, headers=headers)
+        await ac.post("/tasks/", json={"title": "Book flights", "description": "Check passport expiry first", "category": "Travel", "priority": "low"}, headers=headers)
+        await ac.post("/tasks/", json={"title": "Groceries", "category": "Home", "priority": "low"}, headers=headers)
+        await ac.post("/tasks/", json={"title": "Passport photos", "category": "Errands", "priority": "low"}, headers=other)
+
+        results = await ac.get("/tasks/search?q=passports", headers=headers)
+        assert results.status_code == 200
+        assert [r["title"] for r in results.json()] == ["Renew passport", "Book flights"]
+        assert results.json()[0]["rank"] >= results.json()[1]["rank"]
+        assert len((await ac.get("/tasks/search?q=passport&limit=1&skip=1", headers=headers)).json()) == 1
+
+        task_id = in_title.json()["id"]
+        await ac.put(f"/tasks/{task_id}", json={"title": "Renew driving licence"}, headers=headers)
+        assert [r["title"] for r in (await ac.get("/tasks/search?q=licence", headers=headers)).json()] == ["Renew driving licence"]
+        await ac.delete(f"/tasks/{task_id}", headers=headers)
+        assert (await ac.get("/tasks/search?q=licence", headers=headers)).json() == []
+        # Input is never parsed as query syntax
+        assert (await ac.get('/tasks/search?q="OR*(', headers=headers)).json() == []
+
+
+@pytest.mark.asyncio
+async def test_writes_publish_change_events():
+    from services.change_feed import change_feed
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        assert (await ac.get("/events/")).status_code == 401
+        headers = await get_auth_headers(ac, "feed@example.com")
+        created = await ac.post("/tasks/", json={"title": "Live", "category": "Work", "priority": "low"}, headers=headers)
+        task_id = created.json()["id"]
+        user_id = created.json()["owner_id"]
+
+        subscription = await change_feed.subscribe(user_id)
+        try:
+            subtask = await ac.post(f"/tasks/{task_id}/subtasks/", json={"title": "Step"}, headers=headers)
+            await ac.put(f"/tasks/{task_id}/subtasks/{subtask.json()['id']}", json={}, headers=headers)
+            await ac.put(f"/tasks/{task_id}", json={"status": "completed"}, headers=headers)
+            await ac.patch("/tasks/bulk", json=[{"id": task_id, "priority": "high"}], headers=headers)
+            await ac.delete(f"/tasks/{task_id}", headers=headers)
+
+            events = []
+            while (event := await subscription.get(timeout=0.01)) is not None:
+                events.append(event)
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    assert [e["type"] for e in events] == ["subtask.created", "task.updated", "tasks.updated", "task.deleted"]
+    assert events[0]["subtask_id"] == subtask.json()["id"]
+    assert events[2]["task_ids"] == [task_id]
+
+
+@pytest.mark.asyncio
+async def test_event_streams_take_stream_tokens_in_the_url():
+    from routers.events import EVENTS_TOKEN_PURPOSE
+    from routers.tasks import authenticate_token
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "stream@example.com")
+        access_token = headers["Authorization"].split(" ", 1)[1]
+        issued = await ac.post("/events/token", headers=headers)
+        stream_token = issued.json()["token"]
+
+        # The access token is never accepted in the URL, and a stream token
+        # is good for nothing but the stream
+        assert (await ac.get("/events/", params={"token": access_token})).status_code == 401
+        assert (await ac.get("/tasks/", headers={"Authorization": f"Bearer {stream_token}"})).status_code == 401
+        assert (await ac.post("/events/token", headers={"Authorization": f"Bearer {stream_token}"})).status_code == 401
+
+    assert issued.status_code == 200
+    async with TestingSessionLocal() as db:
+        user = await authenticate_token(stream_token, db, purpose=EVENTS_TOKEN_PURPOSE)
+    assert user.email == "stream@example.com"
+
+
+@pytest.mark.asyncio
+async def test_task_changes_delta_sync(monkeypatch):
+    from services import crud_service
+    # Tokens land exactly at the last change so repeat calls return nothing new
+    monkeypatch.setattr(crud_service, "SYNC_OVERLAP_SECONDS", 0)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "changes@example.com")
+        kept = (await ac.post("/tasks/", json={"title": "Kept", "category": "Work", "priority": "low"}, headers=headers)).json()
+        gone = (await ac.post("/tasks/", json={"title": "Gone", "category": "Work", "priority": "low"}, headers=headers)).json()
+
+        first = (await ac.get("/tasks/changes", params={"limit": 1}, headers=headers)).json()
+        second = (await ac.get("/tasks/changes", params={"since": first["next_token"]}, headers=headers)).json()
+        await ac.post(f"/tasks/{kept['id']}/subtasks/", json={"title": "Sub"}, headers=headers)
+        await ac.delete(f"/tasks/{gone['id']}", headers=headers)
+        third = (await ac.get("/tasks/changes", params={"since": second["next_token"]}, headers=headers)).json()
+        invalid = await ac.get("/tasks/changes", params={"since": "not-a-token"}, headers=headers)
+        expired = await ac.get("/tasks/changes", params={
+            "since": crud_service.encode_sync_token(datetime(2000, 1, 1, tzinfo=timezone.utc))}, headers=headers)
+
+    assert ([t["id"] for t in first["changed"]], first["has_more"]) == ([kept["id"]], True)
+    assert ([t["id"] for t in second["changed"]], second["has_more"]) == ([gone["id"]], False)
+    # The subtask write touched its task; the deletion comes back as a tombstone
+    assert [t["id"] for t in third["changed"]] == [kept["id"]]
+    assert [s["title"] for s in third["changed"][0]["subtasks"]] == ["Sub"]
+    assert third["deleted"] == [gone["id"]]
+    assert invalid.status_code == 400
+    assert expired.status_code == 410
+
+
+@pytest.mark.asyncio
+async def test_sync_schema_skips_create_all_when_version_is_current(tmp_path):
+    from services.startup import sync_schema
+
+    schema_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/schema.db")
+    statements = []
+    event.listen(schema_engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    try:
+        assert await sync_schema(schema_engine, mode="auto") == "created"
+        statements.clear()
+        assert await sync_schema(schema_engine, mode="auto") == "current"
+        assert not any(s.lstrip().upper().startswith("CREATE") for s in statements)
+        assert await sync_schema(schema_engine, mode="always") == "created"
+        assert await sync_schema(schema_engine, mode="off") == "skipped"
+    finally:
+        await schema_engine.dispose()
+
+
+# The schema as first deployed, before any column was added to these tables
+BASELINE_SCHEMA = (
+    "CREATE TABLE users (id VARCHAR NOT NULL PRIMARY KEY, email VARCHAR, full_name VARCHAR, hashed_password VARCHAR)",
+    "CREATE TABLE tasks (id VARCHAR NOT NULL PRIMARY KEY, title VARCHAR, description VARCHAR, category VARCHAR, "
+    "priority VARCHAR, status VARCHAR, deadline DATETIME, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), "
+    "owner_id VARCHAR REFERENCES users (id))",
+    "CREATE TABLE subtasks (id VARCHAR NOT NULL PRIMARY KEY, title VARCHAR, is_completed BOOLEAN, "
+    "task_id VARCHAR REFERENCES tasks (id))",
+    "INSERT INTO users (id, email) VALUES ('old-user', 'old@example.com')",
+    "INSERT INTO tasks (id, title, category, priority, status, created_at, owner_id) VALUES "
+    "('old-1', 'Old one', 'Work', 'low', 'pending', '2024-01-01 00:00:00.000000', 'old-user'), "
+    "('old-2', 'Old two', 'Work', 'low', 'pending', '2024-01-02 00:00:00.000000', 'old-user')",
+    "INSERT INTO subtasks (id, title, is_completed, task_id) VALUES "
+    "('sub-1', 'Done', 1, 'old-2'), ('sub-2', 'Open', 0, 'old-2')",
+)
+
+
+async def create_baseline_database(path):
+    baseline = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with baseline.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            await conn.exec_driver_sql(statement)
+    return baseline
+
+
+@pytest.mark.asyncio
+async def test_sync_schema_upgrades_a_baseline_database(tmp_path):
+    from schemas import UserCreate
+    from services import crud_service as crud
+    from services.startup import sync_schema
+    from sqlalchemy import inspect, text
+
+    upgraded = await create_baseline_database(tmp_path / "baseline.db")
+    try:
+        assert await sync_schema(upgraded, mode="auto") == "created"
+        assert await sync_schema(upgraded, mode="auto") == "current"
+        async with upgraded.connect() as conn:
+            columns = await conn.run_sync(lambda c: {
+                name: {col["name"] for col in inspect(c).get_columns(name)} for name in ("users", "tasks", "subtasks")})
+            indexes = await conn.run_sync(lambda c: {i["name"] for i in inspect(c).get_indexes("tasks")})
+        async with AsyncSession(upgraded) as db:
+            user = await crud.create_user(db, UserCreate(email="new@example.com", password="password123"))
+            new_revision = user.task_revision
+            # Rows that predate task_revision start at 0 and can be bumped
+            old_revision = await crud.get_task_revision(db, "old-user")
+            await crud.bump_task_revision(db, "old-user")
+            await db.commit()
+            bumped_revision = await crud.get_task_revision(db, "old-user")
+            counts = (await db.execute(text(
+                "SELECT id, subtask_total, subtask_completed FROM tasks ORDER BY id"))).all()
+            changes = await crud.get_task_changes(db, "old-user")
+    finally:
+        await upgraded.dispose()
+
+    assert {"task_revision"} <= columns["users"]
+    assert {"updated_at", "subtask_total", "subtask_completed"} <= columns["tasks"]
+    assert "updated_at" in columns["subtasks"]
+    assert "ix_tasks_owner_updated_id" in indexes
+    assert new_revision == 0
+    assert (old_revision, bumped_revision) == (0, 1)
+    # Counters of tasks that already had subtasks are backfilled
+    assert [tuple(row) for row in counts] == [("old-1", 0, 0), ("old-2", 2, 1)]
+    # Pre-existing tasks get updated_at from created_at, so the first delta sync includes them
+    assert [t.id for t in changes.changed] == ["old-1", "old-2"]
+    assert changes.changed[0].updated_at.replace(tzinfo=None) == datetime(2024, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_unless_user_wrote_recently(tmp_path, monkeypatch):
+    import database
+
+    # Two database files: the replica never receives the primary's writes
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", sessionmaker(bind=replica_engine, class_=AsyncSession))
+    monkeypatch.setattr(database, "primary_pins", database.PrimaryPins(seconds=60))
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            headers = await get_auth_headers(ac, "replica@example.com")
+            await ac.post("/tasks/", json={"title": "Fresh", "category": "Work", "priority": "low"}, headers=headers)
+            pinned = await ac.get("/tasks/", headers=headers)
+            monkeypatch.setattr(database, "primary_pins", database.PrimaryPins(seconds=60))
+            unpinned = await ac.get("/tasks/", headers=headers)
+    finally:
+        await replica_engine.dispose()
+
+    assert [t["title"] for t in pinned.json()] == ["Fresh"]
+    assert unpinned.json() == []
+    assert database.primary_pins.stats()["replica_reads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_login_is_rejected_before_touching_the_database(monkeypatch):
+    from services import rate_limit
+
+    limiter = rate_limit.RateLimiter(rate_limit.MemoryBucketBackend(), ip_capacity=2, ip_refill=0.01)
+    monkeypatch.setattr(rate_limit, "rate_limiter", limiter)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    credentials = {"username": "nobody@example.com", "password": "wrong"}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        allowed = [await ac.post("/auth/login", data=credentials) for _ in range(2)]
+        event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+        try:
+            rejected = await ac.post("/auth/login", data=credentials)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        unlimited = await ac.get("/")
+
+    assert [r.status_code for r in allowed] == [401, 401]
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) == 100
+    assert statements == []
+    assert unlimited.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_buckets_follow_forwarded_client_ip(monkeypatch):
+    from services import rate_limit
+
+    # Default buckets and costs; the test client connects from 127.0.0.1 like a local router would
+    limiter = rate_limit.RateLimiter(rate_limit.MemoryBucketBackend(), enabled=True, trusted_proxies="127.0.0.1")
+    monkeypatch.setattr(rate_limit, "rate_limiter", limiter)
+    credentials = {"username": "nobody@example.com", "password": "wrong"}
+    burst = int(limiter.ip_capacity)
+
+    async def login(forwarded):
+        return (await ac.post("/auth/login", data=credentials, headers={"X-Forwarded-For": forwarded})).status_code
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        first_client = [await login("203.0.113.1") for _ in range(burst + 1)]
+        # A forged hop to the left of the router's entry does not buy a fresh bucket
+        forged = await login("198.51.100.99, 203.0.113.1")
+        second_client = await login("203.0.113.2")
+
+    assert first_client[:burst] == [401] * burst
+    assert first_client[burst] == 429
+    assert forged == 429
+    assert second_client == 401
+
+
+@pytest.mark.asyncio
+async def test_export_reads_from_its_own_session(monkeypatch):
+    from contextlib import asynccontextmanager
+
+    sessions = []
+
+    @asynccontextmanager
+    async def tracked_session():
+        async with TestingSessionLocal() as session:
+            sessions.append("open")
+            yield session
+        sessions.append("closed")
+
+    monkeypatch.setitem(app.dependency_overrides, get_sessionmaker, lambda: tracked_session)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "own-session@example.com")
+        await ac.post("/tasks/", json={"title": "Streamed", "category": "Work", "priority": "low"}, headers=headers)
+        exported = await ac.get("/tasks/export", headers=headers)
+
+    assert exported.status_code == 200
+    assert [json.loads(line)["title"] for line in exported.text.splitlines()] == ["Streamed"]
+    # Opened by the body itself and closed once, when the stream ended
+    assert sessions == ["open", "closed"]
+
+
+@pytest.mark.asyncio
+async def test_export_then_import_round_trip(monkeypatch):
+    from services import crud_service
+    monkeypatch.setattr(crud_service, "IMPORT_BATCH_SIZE", 2)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        source = await get_auth_headers(ac, "export@example.com")
+        for title in ("First", "Second", "Third"):
+            task = (await ac.post("/tasks/", json={"title": title, "category": "Work", "priority": "low"},
+                                  headers=source)).json()
+        await ac.post(f"/tasks/{task['id']}/subtasks/", json={"title": "Step, \"quoted\"", "is_completed": True},
+                      headers=source)
+        ndjson = await ac.get("/tasks/export", headers=source)
+        exported_csv = await ac.get("/tasks/export", params={"format": "csv"}, headers=source)
+
+        target = await get_auth_headers(ac, "import@example.com")
+        imported = await ac.post("/tasks/import", content=exported_csv.content + b"no,columns\n",
+                                 headers={**target, "Content-Type": "text/csv"})
+        tasks = (await ac.get("/tasks/", params={"sort": "created_at"}, headers=target)).json()
+        bad_header = await ac.post("/tasks/import", params={"format": "csv"}, content=b"name\nx\n", headers=target)
+
+    lines = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    assert [t["title"] for t in lines] == ["First", "Second", "Third"]
+    assert [s["title"] for s in lines[2]["subtasks"]] == ['Step, "quoted"']
+
+    assert imported.status_code == 200
+    result = imported.json()
+    assert (result["imported"], result["subtasks"], result["failed"], result["batches"]) == (3, 1, 1, 2)
+    assert result["errors"][0]["line"] == 5
+    assert [t["title"] for t in tasks] == ["First", "Second", "Third"]
+    assert all(t["id"] not in {l["id"] for l in lines} for t in tasks)
+    assert (tasks[2]["subtask_total"], tasks[2]["subtask_completed"]) == (1, 1)
+    assert tasks[2]["subtasks"][0]["is_completed"] is True
+    assert bad_header.status_code == 400
+    assert bad_header.json()["aborted"] == "CSV header must include a title column"
+
+
+@pytest.mark.asyncio
+async def test_database_health():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/health/db")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+    assert "pool_class" in response.json()["pool"]
+
+
+@pytest.mark.asyncio
+async def test_database_health_hides_connection_errors(monkeypatch):
+    import database
+    broken = create_async_engine("sqlite+aiosqlite:////nonexistent-dir/app.db")
+    monkeypatch.setattr(database, "engine", broken)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/health/db")
+    await broken.dispose()
+
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+    assert "error" not in response.json()
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_routes_and_db_usage():
+    def statements_sum(body):
+        prefix = 'db_statements_per_request_sum{route="/tasks/stats"}'
+        return next((float(line.split()[-1]) for line in body.splitlines() if line.startswith(prefix)), 0.0)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await get_auth_headers(ac, "metrics@example.com")
+        before = statements_sum((await ac.get("/metrics")).text)
+        await ac.get("/tasks/stats", headers=headers)
+        response = await ac.get("/metrics")
+
+    assert response.status_code == 200
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/tasks/stats",status="200"}' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/tasks/stats"}' in body
+    # One SELECT for the user (principal cache miss) plus the aggregate query
+    assert statements_sum(body) - before == 2
+    assert "auth_cache_hits_total" in body
+    assert "gemini_breaker_state" in body
+    assert "summary_jobs_submitted_total" in body
@@ -0,0 +1,29 @@
+import asyncio
+import threading
+import pytest
+from services.password_service import PasswordHasher, PasswordHasherBusy
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_round_trip():
+    hasher = PasswordHasher(kind="thread", max_workers=1, max_queue=1)
+    hashed = await hasher.hash("password123")
+    assert await hasher.verify("password123", hashed)
+    assert not await hasher.verify("wrong", hashed)
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher(kind="thread", max_workers=1, max_queue=0)
+    release = threading.Event()
+    blocked = asyncio.create_task(hasher.run(release.wait))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(PasswordHasherBusy):
+        await hasher.hash("password123")
+    assert hasher.rejected == 1
+
+    release.set()
+    await blocked
+    hasher.shutdown()
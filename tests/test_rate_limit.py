@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from services.rate_limit import MemoryBucketBackend, RateLimiter, SQLiteBucketBackend, TrustedProxies, take_tokens
+
+
+def test_take_tokens_charges_all_buckets_or_none():
+    buckets = {"ip": (1.0, 0.0)}
+
+    def write(key, tokens, updated_at):
+        buckets[key] = (tokens, updated_at)
+
+    charges = [("ip", 2, 5, 1.0), ("user", 2, 5, 1.0)]
+    # The IP bucket is short by one token: nothing is charged, wait one second
+    assert take_tokens(buckets.get, write, charges, now=0.0) == 1.0
+    assert buckets == {"ip": (1.0, 0.0)}
+    # Two seconds later it has refilled to 3
+    assert take_tokens(buckets.get, write, charges, now=2.0) == 0.0
+    assert buckets == {"ip": (1.0, 2.0), "user": (3.0, 2.0)}
+
+
+@pytest.mark.asyncio
+async def test_limiter_caps_concurrency_per_group():
+    limiter = RateLimiter(MemoryBucketBackend(), group_concurrency={"ai": 1}, ip_capacity=100)
+    assert await limiter.admit("ai", 1, "10.0.0.1") is None
+    assert await limiter.admit("ai", 1, "10.0.0.2") == (503, 1.0)
+    limiter.release("ai")
+    assert await limiter.admit("ai", 1, "10.0.0.2") is None
+    assert limiter.stats()["concurrency_limited"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_is_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    # Two workers on one host, each with its own backend instance
+    workers = [SQLiteBucketBackend(path), SQLiteBucketBackend(path)]
+    charges = [("ip:10.0.0.1", 1, 4, 0.001)]
+    waits = await asyncio.gather(*(workers[i % 2].take(charges) for i in range(6)))
+    assert sum(1 for wait in waits if wait == 0) == 4
+
+
+def test_trusted_proxies_resolve_the_forwarded_client():
+    proxies = TrustedProxies("10.0.0.0/8, 192.168.1.5")
+    # Untrusted peers cannot pick their own bucket
+    assert proxies.client_ip("203.0.113.7", "198.51.100.1") == "203.0.113.7"
+    # The first untrusted hop from the right is the client; forged entries to its left are ignored
+    assert proxies.client_ip("10.1.2.3", "198.51.100.1, 203.0.113.7, 192.168.1.5") == "203.0.113.7"
+    assert proxies.client_ip("10.1.2.3", None) == "10.1.2.3"
+
+    router = TrustedProxies("*")
+    assert router.client_ip("172.16.0.9", "198.51.100.1, 203.0.113.7") == "203.0.113.7"
+    assert TrustedProxies("").client_ip("172.16.0.9", "203.0.113.7") == "172.16.0.9"
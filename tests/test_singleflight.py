@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+from services.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = 0
+
+    async def slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(flight.do("user:abc", slow) for _ in range(5)))
+    assert results == [1] * 5
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 4}
+
+    # Once finished, the next call runs again
+    assert await flight.do("user:abc", slow) == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_exceptions():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(flight.do("k", failing) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
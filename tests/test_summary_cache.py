@@ -0,0 +1,37 @@
+import pytest
+from services.summary_cache import MemoryCacheBackend, SQLiteCacheBackend, SummaryCache
+
+
+@pytest.mark.asyncio
+async def test_summary_cache_hit_rate_and_saved_latency():
+    cache = SummaryCache(MemoryCacheBackend(max_entries=10), ttl_seconds=60)
+    key = SummaryCache.fingerprint("model", "prompt")
+    assert key == SummaryCache.fingerprint("model", "prompt")
+    assert key != SummaryCache.fingerprint("model", "other prompt")
+
+    assert await cache.get(key) is None
+    await cache.set(key, {"insights": [], "actionItems": ["a"]}, latency=1.5)
+    assert await cache.get(key) == {"insights": [], "actionItems": ["a"]}
+    assert cache.stats()["hit_rate"] == 0.5
+    assert cache.stats()["saved_upstream_seconds"] == 1.5
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2)
+    await backend.set("a", {"v": 1}, ttl=60)
+    await backend.set("b", {"v": 2}, ttl=60)
+    await backend.get("a")
+    await backend.set("c", {"v": 3}, ttl=60)
+    assert await backend.get("b") is None
+    assert await backend.get("a") == {"v": 1}
+
+    await backend.set("expired", {"v": 4}, ttl=-1)
+    assert await backend.get("expired") is None
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    await SQLiteCacheBackend(path, max_entries=10).set("key", {"v": 1}, ttl=60)
+    assert await SQLiteCacheBackend(path, max_entries=10).get("key") == {"v": 1}
@@ -0,0 +1,35 @@
+import pytest
+from services import task_transfer
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(records):
+    return [record async for record in records]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_records_split_across_chunks():
+    records = await collect(task_transfer.ndjson_records(stream(b'{"title": "a"}\n{"ti', b'tle": "b"}\n\nnot json\n[1]')))
+    assert records[:2] == [(1, {"title": "a"}), (2, {"title": "b"})]
+    assert [(line, type(error)) for line, error in records[2:]] == [(4, ValueError), (5, ValueError)]
+
+
+@pytest.mark.asyncio
+async def test_csv_records_allow_quoted_newlines_and_report_bad_rows():
+    body = 'title,description\n"one","two\nlines"\nshort\nété,\n'.encode()
+    split = body.index("é".encode()) + 1  # inside a multi-byte character
+    records = await collect(task_transfer.csv_records(stream(body[:20], body[20:split], body[split:])))
+    assert records[0] == (2, {"title": "one", "description": "two\nlines"})
+    assert records[1][0] == 4 and isinstance(records[1][1], ValueError)
+    assert records[2] == (5, {"title": "été", "description": None})
+
+
+@pytest.mark.asyncio
+async def test_oversized_record_aborts_the_stream(monkeypatch):
+    monkeypatch.setattr(task_transfer, "IMPORT_MAX_RECORD_BYTES", 10)
+    with pytest.raises(task_transfer.RecordTooLarge):
+        await collect(task_transfer.ndjson_records(stream(b'{"title": "', b"x" * 20)))
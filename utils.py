@@ -1,16 +1,15 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import jwt
-from passlib.context import CryptContext
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import config  # noqa: F401  loads .env
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    # Imported on first use to keep worker start-up fast
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta